@@ -0,0 +1,239 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import greedy_timetabling as gt
+
+# Size of the current dataset, which scale 1 reproduces
+BASE_STUDENTS = 650
+BASE_COURSES = 100
+BASE_ROOMS = 24
+BASE_LECTURERS = 40
+COURSES_PER_STUDENT = 5
+STUDENTS_PER_SECTION = 30
+
+
+def generate_synthetic_problem(out_dir, scale=1.0, seed=0):
+    """
+    Write a synthetic AdvisedCourses/CourseDetails/Rooms/LecturerPreferences set to out_dir.
+
+    Students are grouped into cohorts that mostly take courses from their own cohort's
+    pool, which gives clash graphs with the same dense blocks as real advising data.
+
+    Args:
+    out_dir (str): Directory for the four CSV files; created if missing.
+    scale (float): Multiple of the current dataset size (1 = ~650 students, ~100 courses).
+    seed (int): Random seed.
+
+    Returns:
+    dict: Paths of the generated files and the sizes used.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    n_students = max(1, int(BASE_STUDENTS * scale))
+    n_courses = max(COURSES_PER_STUDENT, int(BASE_COURSES * scale))
+    n_rooms = max(2, int(BASE_ROOMS * scale))
+    n_lecturers = max(1, int(BASE_LECTURERS * scale))
+
+    courses = np.array([f"SYN{i:05d}" for i in range(n_courses)], dtype=object)
+    students = np.array([f"S{i:07d}" for i in range(n_students)], dtype=object)
+
+    # Cohorts of ~20 courses; each student takes most courses from one cohort and a few electives
+    n_cohorts = max(1, n_courses // 20)
+    cohort_of_course = np.arange(n_courses) % n_cohorts
+    cohort_of_student = rng.integers(0, n_cohorts, n_students)
+    popularity = rng.pareto(1.5, n_courses) + 1.0
+
+    records = []
+    for student, cohort in zip(students, cohort_of_student):
+        pool = np.flatnonzero(cohort_of_course == cohort)
+        n_core = min(len(pool), COURSES_PER_STUDENT - 1)
+        weights = popularity[pool] / popularity[pool].sum()
+        chosen = set(rng.choice(pool, n_core, replace=False, p=weights).tolist())
+        chosen.add(int(rng.integers(0, n_courses)))
+        records.extend((student, courses[c]) for c in chosen)
+
+    df_advised = pd.DataFrame(records, columns=['StudentNo', 'CourseNo'])
+    df_advised.insert(0, 'RecNo', np.arange(1, len(df_advised) + 1))
+    df_advised['CourseName'] = df_advised['CourseNo'].str.replace('SYN', 'Synthetic Course ', regex=False)
+
+    enrollment = df_advised['CourseNo'].value_counts()
+    df_courses = pd.DataFrame({'CourseNo': courses})
+    df_courses['CourseName'] = df_courses['CourseNo'].str.replace('SYN', 'Synthetic Course ', regex=False)
+    df_courses['NumberOfAdvisedStudents'] = df_courses['CourseNo'].map(enrollment).fillna(0).astype(int)
+    df_courses = df_courses[df_courses['NumberOfAdvisedStudents'] > 0].reset_index(drop=True)
+    df_courses['NumberOfSections'] = [max(1, math.ceil(n / STUDENTS_PER_SECTION)) for n in df_courses['NumberOfAdvisedStudents']]
+    df_courses['AverageStudentsPerSection'] = (df_courses['NumberOfAdvisedStudents'] / df_courses['NumberOfSections']).round().astype(int)
+    df_courses['ContactHours'] = rng.choice([3, 4, 5, 6], len(df_courses))
+    df_courses['NumberofSessions'] = [len([2] * (c // 2) + ([1] if c % 2 else [])) for c in df_courses['ContactHours']]
+    df_courses['RoomType'] = rng.choice(['Lecture', 'Lab'], len(df_courses), p=[0.6, 0.4])
+
+    n_lecture_rooms = max(1, int(n_rooms * 0.6))
+    df_rooms = pd.DataFrame({
+        'RoomNo': [f"C{i:04d}" for i in range(n_lecture_rooms)] + [f"E{i:04d}" for i in range(n_rooms - n_lecture_rooms)],
+        'Type': ['Lecture'] * n_lecture_rooms + ['Lab'] * (n_rooms - n_lecture_rooms),
+    })
+    df_rooms['Capacity'] = rng.choice([25, 35, 50, 80], len(df_rooms))
+
+    # Every course is somebody's preference; the remaining slots are filled at random
+    course_list = df_courses['CourseNo'].tolist()
+    prefs = rng.choice(course_list, (n_lecturers, 5))
+    for i, course in enumerate(course_list):
+        prefs[i % n_lecturers, (i // n_lecturers) % 5] = course
+    df_lecturers = pd.DataFrame({
+        'Sno': np.arange(1, n_lecturers + 1),
+        'FacultyID': [f"F{i:05d}" for i in range(n_lecturers)],
+        'FacultyName': [f"Lecturer {i}" for i in range(n_lecturers)],
+        'MaxLoad': 12,
+    })
+    for j in range(5):
+        df_lecturers[f"Pref{j + 1}"] = prefs[:, j]
+
+    paths = {
+        'advised_courses': os.path.join(out_dir, 'AdvisedCourses.csv'),
+        'course_details': os.path.join(out_dir, 'CourseDetails.csv'),
+        'rooms': os.path.join(out_dir, 'Rooms.csv'),
+        'lecturer_prefs': os.path.join(out_dir, 'LecturerPreferences.csv'),
+    }
+    df_advised.to_csv(paths['advised_courses'], index=False)
+    df_courses.to_csv(paths['course_details'], index=False)
+    df_rooms.to_csv(paths['rooms'], index=False)
+    df_lecturers.to_csv(paths['lecturer_prefs'], index=False)
+
+    return {'paths': paths, 'students': n_students, 'courses': len(df_courses), 'records': len(df_advised),
+            'rooms': n_rooms, 'lecturers': n_lecturers}
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_benchmark(paths, out_dir, clique_mode='all', clique_limit=None):
+    """
+    Run the pipeline stage by stage on one dataset and time each stage.
+
+    The peak RSS of a stage is the process's high-water mark once the stage is done, so it
+    only describes this dataset when the process runs nothing else (see run_scale).
+
+    Returns:
+    list: One dict per stage with seconds, items processed, items per second and peak RSS.
+    """
+    stages = []
+
+    def timed(name, items_label, func):
+        start = time.perf_counter()
+        result, items = func()
+        seconds = time.perf_counter() - start
+        stages.append({'stage': name, 'seconds': round(seconds, 6), 'items': items, 'unit': items_label,
+                       'per_second': round(items / seconds, 2) if seconds > 0 else None,
+                       'peak_rss_mb': round(peak_rss_mb(), 1)})
+        return result
+
+    problem = gt.TimetablingProblem(paths['advised_courses'], paths['course_details'], paths['rooms'], paths['lecturer_prefs'])
+
+    def load():
+        frames = (problem.df_advised_courses, problem.df_course_details, problem.df_rooms, problem.df_lecturer_prefs)
+        return frames, sum(len(frame) for frame in frames)
+    timed('load', 'rows', load)
+
+    G = timed('clash_graph', 'records',
+              lambda: (problem.clash_graph, len(problem.df_advised_courses)))
+    sorted_cliques = timed('cliques', 'cliques',
+                           lambda: (lambda c: (c, len(c)))(gt.rank_cliques(G, problem.df_course_details, clique_mode, clique_limit)))
+
+    resource_index = gt.build_resource_index(problem.df_rooms, problem.df_lecturer_prefs)
+    calendar = problem.calendar
+    occupancy = gt.ClashOccupancy(G, len(calendar.time_slots))
+
+    def schedule():
+        result = gt.schedule_sections(sorted_cliques, problem.df_course_details, problem.df_rooms, problem.df_lecturer_prefs,
+                                      resource_index, calendar, occupancy)
+        return result, len(result[0].section_rows)
+    timetable, room_availability, lecturer_availability, time_slots, _ = timed('schedule_sections', 'sections', schedule)
+
+    def repair():
+        result, _ = gt.handle_unscheduled_courses_and_sessions(timetable, problem.df_course_details, room_availability,
+                                                               lecturer_availability, time_slots, resource_index, calendar, occupancy)
+        return result, len(result.section_rows)
+    timetable = timed('handle_unscheduled', 'sections', repair)
+
+    def output():
+        gt.output_timetable_with_sessions(timetable, os.path.join(out_dir, 'final_timetable.csv'))
+        return None, len(timetable)
+    timed('output', 'sessions', output)
+
+    unscheduled = len(timetable.unscheduled_rows())
+    return stages, unscheduled
+
+
+def run_scale(scale, base_dir, seed, clique_mode='all', clique_limit=None):
+    """
+    Generate the dataset for one scale and benchmark it.
+
+    Returns:
+    dict: The run entry of the JSON report.
+    """
+    out_dir = os.path.join(base_dir, f"scale_{scale:g}")
+    dataset = generate_synthetic_problem(out_dir, scale, seed)
+    stages, unscheduled = run_benchmark(dataset['paths'], out_dir, clique_mode, clique_limit)
+    return {
+        'scale': scale,
+        'dataset': {key: value for key, value in dataset.items() if key != 'paths'},
+        'stages': stages,
+        'total_seconds': round(sum(stage['seconds'] for stage in stages), 6),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'unscheduled_sessions': unscheduled,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the timetabling pipeline on synthetic data")
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10],
+                        help="dataset sizes as multiples of the current data (default: 1 10)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the generator")
+    parser.add_argument('--clique-mode', choices=['all', 'top-k', 'cover'], default='all',
+                        help="clique stage to benchmark (default: all)")
+    parser.add_argument('--clique-limit', type=int, default=None,
+                        help="cap on enumerated cliques, or k for --clique-mode top-k")
+    parser.add_argument('--data-dir', default=None,
+                        help="keep the generated data under this directory (default: a temporary directory)")
+    parser.add_argument('--out', default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    if args.clique_mode == 'top-k' and args.clique_limit is None:
+        parser.error("--clique-mode top-k needs --clique-limit K")
+
+    report = {'seed': args.seed, 'clique_mode': args.clique_mode, 'clique_limit': args.clique_limit, 'runs': []}
+    # Each scale runs in a fresh process, so its peak RSS is not inherited from an earlier scale
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        base_dir = args.data_dir or tmp_dir
+        for scale in args.scales:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                run = executor.submit(run_scale, scale, base_dir, args.seed, args.clique_mode, args.clique_limit).result()
+            report['runs'].append(run)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,507 @@
 import pandas as pd
+import numpy as np
 import networkx as nx
-import datetime
-from itertools import combinations
-from copy import deepcopy
+from scipy import sparse
+import argparse
+import bisect
+import contextlib
+import cProfile
+import hashlib
+import heapq
+import html
+import json
+import math
+import os
+import pickle
+import pstats
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+from itertools import chain, combinations, islice, repeat
+
+class PipelineProfiler:
+    """
+    Opt-in wall times per pipeline stage and counters for the scheduling hot paths.
+
+    While a profiler is active (see profiling), stages wrapped in profile_stage are timed
+    and the scheduler counts slot probes, room and lecturer checks and failed placements
+    per course. Stages named in profile_stages are also run under cProfile.
+
+    Args:
+    profile_stages (list): Stage names to run under cProfile.
+    top_functions (int): Number of functions kept per cProfile report, by cumulative time.
+    """
+
+    def __init__(self, profile_stages=(), top_functions=30):
+        self.profile_stages = set(profile_stages)
+        self.top_functions = top_functions
+        self.stages = []
+        self.counters = {}
+        self.failed_placements = {}
+        self.profiles = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def failed_placement(self, course, n=1):
+        self.failed_placements[course] = self.failed_placements.get(course, 0) + n
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        profiler = cProfile.Profile() if name in self.profile_stages else None
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.profiles[name] = self._profile_rows(profiler)
+            self.stages.append({'stage': name, 'seconds': round(time.perf_counter() - start, 6)})
+
+    def _profile_rows(self, profiler):
+        stats = pstats.Stats(profiler)
+        rows = []
+        for (file_name, line, function), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({'function': f"{os.path.basename(file_name)}:{line}({function})", 'ncalls': ncalls,
+                         'tottime': round(tottime, 6), 'cumtime': round(cumtime, 6)})
+        rows.sort(key=lambda row: row['cumtime'], reverse=True)
+        return rows[:self.top_functions]
+
+    def to_dict(self):
+        return {'stages': self.stages, 'counters': self.counters,
+                'failed_placements': dict(sorted(self.failed_placements.items(), key=lambda item: -item[1])),
+                'profiles': self.profiles}
+
+    def write(self, file_path):
+        """
+        Write the collected timings, counters and profiles to a JSON trace file.
+        """
+        with open(file_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+# The active PipelineProfiler, if any; the hot paths check it before counting
+_profiler = None
+
+@contextlib.contextmanager
+def profiling(profiler):
+    """
+    Make profiler the active PipelineProfiler for the duration of the block.
+    """
+    global _profiler
+    previous, _profiler = _profiler, profiler
+    try:
+        yield profiler
+    finally:
+        _profiler = previous
+
+def profile_stage(name):
+    """
+    Time a pipeline stage on the active profiler; does nothing when none is active.
+    """
+    return _profiler.stage(name) if _profiler is not None else contextlib.nullcontext()
+
+
+# Default input files, relative to the working directory
+DEFAULT_ADVISED_COURSES = 'AdvisedCourses.csv'
+DEFAULT_COURSE_DETAILS = 'CourseDetails.csv'
+DEFAULT_ROOMS = 'Rooms.csv'
+DEFAULT_LECTURER_PREFS = 'LecturerPreferences.csv'
+DEFAULT_COURSE_EQUIVALENCES = 'CourseEquivalences.csv'
+
+
+class TimetablingProblem:
+    """
+    Input data for one timetabling run.
+
+    Each dataset is read from its CSV file the first time it is used, and the clash graph,
+    the student sectioning with its section-level clash graph, and the resource index are
+    built once and cached, so creating a problem (or importing this module) does not touch the disk.
+    Later advising changes are applied with apply_delta instead of rebuilding everything.
+
+    Args:
+    advised_courses (str): Path to the advising records.
+    course_details (str): Path to the course details.
+    rooms (str): Path to the rooms file.
+    lecturer_prefs (str): Path to the lecturer preferences file.
+    calendar (SlotCalendar): Teaching week; the default week if not given.
+    cache (ClashCache): Optional on-disk cache for the clash graph and ranked cliques.
+    chunksize (int): If set, the clash graph is built by streaming the advising file in
+                     chunks of this many rows, without loading it as a DataFrame.
+    equivalences (str): Optional course equivalence mapping (see CourseEquivalences); the
+                        advising records' cross-listed codes are merged with it as they are read.
+    """
+
+    def __init__(self, advised_courses=DEFAULT_ADVISED_COURSES, course_details=DEFAULT_COURSE_DETAILS,
+                 rooms=DEFAULT_ROOMS, lecturer_prefs=DEFAULT_LECTURER_PREFS, calendar=None, cache=None, chunksize=None,
+                 equivalences=None):
+        self.advised_courses_path = advised_courses
+        self.course_details_path = course_details
+        self.rooms_path = rooms
+        self.lecturer_prefs_path = lecturer_prefs
+        self._calendar = calendar
+        self.cache = cache
+        self.chunksize = chunksize
+        self.equivalences_path = equivalences
+
+    @cached_property
+    def course_equivalences(self):
+        if self.equivalences_path is None:
+            return None
+        return CourseEquivalences.from_csv(self.equivalences_path)
+
+    @cached_property
+    def df_advised_courses(self):
+        return merge_equivalent_courses(pd.read_csv(self.advised_courses_path), self.course_equivalences)
+
+    @cached_property
+    def df_course_details(self):
+        return pd.read_csv(self.course_details_path)
+
+    @cached_property
+    def df_rooms(self):
+        return pd.read_csv(self.rooms_path)
+
+    @cached_property
+    def df_lecturer_prefs(self):
+        return pd.read_csv(self.lecturer_prefs_path)
+
+    @cached_property
+    def calendar(self):
+        return self._calendar if self._calendar is not None else get_default_calendar()
+
+    @cached_property
+    def advising_key(self):
+        # Both paths hash the merged records as text, so --chunksize does not change the key
+        if self.chunksize and 'df_advised_courses' not in self.__dict__:
+            return hash_advising_csv(self.advised_courses_path, self.chunksize, self.course_equivalences)
+        return hash_advising_records(self.df_advised_courses)
+
+    def _build_clash_graph(self):
+        if self.chunksize and 'df_advised_courses' not in self.__dict__:
+            incidence, courses, _ = build_incidence_matrix_from_csv(self.advised_courses_path, self.chunksize,
+                                                                    self.course_equivalences)
+            return clash_graph_from_edges(*clash_edges_from_incidence(incidence, courses))
+        return build_clash_graph(self.df_advised_courses)
+
+    @cached_property
+    def clash_graph(self):
+        if self.cache is None:
+            return self._build_clash_graph()
+        key = f"graph-{self.advising_key}"
+        G = self.cache.get(key)
+        if G is None:
+            G = self._build_clash_graph()
+            self.cache.put(key, G)
+        return G
+
+    def ranked_cliques(self, mode='all', limit=None):
+        """
+        Return the cliques sorted for scheduling (see rank_cliques), from the cache when possible.
+        """
+        # After apply_delta the maximal cliques are already up to date
+        if mode == 'all' and limit is None and 'incremental_clash_graph' in self.__dict__:
+            return sort_cliques_by_total_enrollment(self.incremental_clash_graph.cliques, self.df_course_details)
+
+        if self.cache is None:
+            return rank_cliques(self.clash_graph, self.df_course_details, mode, limit)
+
+        # Clique order also depends on the enrollment figures in the course details
+        enrollment = self.df_course_details[['CourseNo', 'NumberOfAdvisedStudents']]
+        enrollment_key = hashlib.sha256(pd.util.hash_pandas_object(enrollment, index=False).values.tobytes()).hexdigest()
+        key = f"cliques-{self.advising_key}-{enrollment_key[:16]}-{mode}-{limit}"
+        cliques = self.cache.get(key)
+        if cliques is None:
+            cliques = rank_cliques(self.clash_graph, self.df_course_details, mode, limit)
+            self.cache.put(key, cliques)
+        return cliques
+
+    @cached_property
+    def student_sections(self):
+        return assign_students_to_sections(self.df_advised_courses, self.df_course_details)
+
+    @cached_property
+    def section_clash_graph(self):
+        if self.cache is None:
+            return build_section_clash_graph(self.student_sections)
+
+        # The sectioning also depends on the number of sections in the course details
+        sections = self.df_course_details[['CourseNo', 'NumberOfSections']]
+        sections_key = hashlib.sha256(pd.util.hash_pandas_object(sections, index=False).values.tobytes()).hexdigest()
+        key = f"section-graph-{self.advising_key}-{sections_key[:16]}"
+        G = self.cache.get(key)
+        if G is None:
+            G = build_section_clash_graph(self.student_sections)
+            self.cache.put(key, G)
+        return G
+
+    @cached_property
+    def resource_index(self):
+        return build_resource_index(self.df_rooms, self.df_lecturer_prefs)
+
+    @cached_property
+    def incremental_clash_graph(self):
+        return IncrementalClashGraph(self.df_advised_courses, self.clash_graph)
+
+    def apply_delta(self, delta):
+        """
+        Apply advising changes to the records, clash graph and maximal cliques without rebuilding them.
+
+        Only the edges of the changed students' courses and the cliques around them are
+        recomputed (see IncrementalClashGraph). The advising records keep their order, with
+        removed records dropped and added ones appended, and everything derived from them
+        (cache key, student sections) is rebuilt on next use.
+
+        Args:
+        delta (list): (StudentNo, CourseNo, action) records with action 'add' or 'remove', e.g.
+                      from load_advising_delta.
+
+        Returns:
+        set: The courses whose clash edges changed.
+        """
+        incremental = self.incremental_clash_graph
+        touched = incremental.apply_delta(delta)
+
+        pairs = {(student, course) for student, courses in incremental.student_courses.items() for course in courses}
+        df = self.df_advised_courses
+        existing = list(zip(df['StudentNo'], df['CourseNo']))
+        present = set(existing)
+        added = list(dict.fromkeys((student, course) for student, course, _ in delta
+                                   if (student, course) in pairs and (student, course) not in present))
+        df = df[[pair in pairs for pair in existing]]
+        if added:
+            df = pd.concat([df, pd.DataFrame(added, columns=['StudentNo', 'CourseNo'])], ignore_index=True)
+
+        self.__dict__['df_advised_courses'] = df.reset_index(drop=True)
+        self.__dict__['clash_graph'] = incremental.graph
+        for name in ('advising_key', 'student_sections', 'section_clash_graph'):
+            self.__dict__.pop(name, None)
+        if self.cache is not None:
+            self.cache.put(f"graph-{self.advising_key}", incremental.graph)
+        return touched
+
+
+def _advising_text_hashes(df):
+    # Per-row hashes of StudentNo and CourseNo as plain text, the form read_csv(dtype=str) gives
+    records = df[['StudentNo', 'CourseNo']].dropna()
+    text = pd.DataFrame({column: records[column].astype(str).to_numpy(dtype=object) for column in records.columns})
+    return pd.util.hash_pandas_object(text, index=False).to_numpy().tobytes()
+
+def hash_advising_records(df):
+    """
+    Hash the (StudentNo, CourseNo) content of the advising records.
+
+    Rows with a missing value are skipped and the rest are hashed as text, so the key only
+    depends on the records and not on the dtypes they were parsed with. The records are
+    hashed after course equivalences are merged, so a change to the mapping changes the key.
+    """
+    digest = hashlib.sha256()
+    digest.update(_advising_text_hashes(df))
+    return digest.hexdigest()
+
+
+class ClashCache:
+    """
+    On-disk cache of clash graphs and ranked clique lists, keyed on the advising data.
+
+    Entries are pickles in cache_dir. A hit refreshes the file's modification time, and
+    once the directory grows past max_bytes the least recently used entries are removed.
+
+    Args:
+    cache_dir (str): Directory for cache entries; created if missing.
+    max_bytes (int): Size limit for the whole directory.
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(path)
+        return value
+
+    def put(self, key, value):
+        """
+        Store a value and evict old entries if the cache is over its size limit.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+
+_default_problem = None
+
+def get_default_problem():
+    """
+    Return the shared TimetablingProblem over the default files in the working directory.
+    """
+    global _default_problem
+    if _default_problem is None:
+        equivalences = DEFAULT_COURSE_EQUIVALENCES if os.path.exists(DEFAULT_COURSE_EQUIVALENCES) else None
+        _default_problem = TimetablingProblem(equivalences=equivalences)
+    return _default_problem
+
+# Problem bundles: the inputs, integer ids and clash counts compiled to Arrow files
+BUNDLE_VERSION = 2
+BUNDLE_TABLES = {
+    'df_advised_courses': 'advised_courses.arrow',
+    'df_course_details': 'course_details.arrow',
+    'df_rooms': 'rooms.arrow',
+    'df_lecturer_prefs': 'lecturer_prefs.arrow',
+}
+
+def compile_problem(problem, bundle_dir):
+    """
+    Write a problem to a bundle directory of uncompressed Arrow IPC files.
+
+    The bundle holds the four input tables, the course and student id mappings, the
+    clash counts as (course1_id, course2_id, weight) rows and the course equivalences,
+    plus a manifest.json. Loading it with load_problem_bundle memory-maps the files and
+    skips CSV parsing and the clash computation; the bundle does not need the source
+    files, so it can be moved to another machine.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    os.makedirs(bundle_dir, exist_ok=True)
+
+    for attribute, file_name in BUNDLE_TABLES.items():
+        table = pa.Table.from_pandas(getattr(problem, attribute), preserve_index=False)
+        feather.write_feather(table, os.path.join(bundle_dir, file_name), compression='uncompressed')
+
+    df_advised_courses = problem.df_advised_courses
+    courses, rows, cols, weights = compute_clash_edges(df_advised_courses)
+    _, students = pd.factorize(df_advised_courses['StudentNo'])
+
+    feather.write_feather(pa.table({'course_id': np.arange(len(courses), dtype=np.int32), 'CourseNo': courses}),
+                          os.path.join(bundle_dir, 'courses.arrow'), compression='uncompressed')
+    feather.write_feather(pa.table({'student_id': np.arange(len(students), dtype=np.int32), 'StudentNo': np.asarray(students)}),
+                          os.path.join(bundle_dir, 'students.arrow'), compression='uncompressed')
+    feather.write_feather(pa.table({'course1_id': rows.astype(np.int32), 'course2_id': cols.astype(np.int32),
+                                    'weight': weights.astype(np.int32)}),
+                          os.path.join(bundle_dir, 'clash_edges.arrow'), compression='uncompressed')
+
+    # Each code with its group's representative; CourseEquivalences(pairs) rebuilds the same groups
+    equivalences = problem.course_equivalences
+    if equivalences is not None:
+        codes = sorted(equivalences.parent, key=equivalences.order.get)
+        feather.write_feather(pa.table({'CourseNo': pa.array(codes, pa.string()),
+                                        'EquivalentCourseNo': pa.array([equivalences.find(code) for code in codes], pa.string())}),
+                              os.path.join(bundle_dir, 'equivalences.arrow'), compression='uncompressed')
+
+    manifest = {
+        'version': BUNDLE_VERSION,
+        'sources': {
+            'advised_courses': problem.advised_courses_path,
+            'course_details': problem.course_details_path,
+            'rooms': problem.rooms_path,
+            'lecturer_prefs': problem.lecturer_prefs_path,
+            'equivalences': problem.equivalences_path,
+        },
+        'courses': len(courses),
+        'students': len(students),
+        'clash_edges': len(weights),
+        'equivalences_key': equivalences.key() if equivalences is not None else None,
+    }
+    with open(os.path.join(bundle_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def load_problem_bundle(bundle_dir, calendar=None):
+    """
+    Load a TimetablingProblem from a bundle written by compile_problem.
+
+    Numeric columns are views on the memory-mapped files. String columns stay in Arrow
+    memory too when pandas stores strings in Arrow (the default from pandas 3); older
+    pandas copies them into object columns.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    with open(os.path.join(bundle_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != BUNDLE_VERSION:
+        raise ValueError(f"Unsupported problem bundle version {manifest.get('version')} in {bundle_dir}")
+
+    def read_table(file_name):
+        return feather.read_table(os.path.join(bundle_dir, file_name), memory_map=True)
+
+    sources = manifest['sources']
+    problem = TimetablingProblem(sources['advised_courses'], sources['course_details'], sources['rooms'],
+                                 sources['lecturer_prefs'], calendar)
+    problem.equivalences_path = sources.get('equivalences')
+
+    # Fill the cached properties directly so nothing is read from the source files.
+    # split_blocks keeps each column as its own block instead of copying them into one 2-D array
+    for attribute, file_name in BUNDLE_TABLES.items():
+        problem.__dict__[attribute] = read_table(file_name).to_pandas(split_blocks=True)
+
+    equivalences = None
+    if manifest.get('equivalences_key') is not None:
+        pairs = read_table('equivalences.arrow')
+        equivalences = CourseEquivalences(zip(pairs.column('CourseNo').to_pylist(), pairs.column('EquivalentCourseNo').to_pylist()))
+        if equivalences.key() != manifest['equivalences_key']:
+            raise ValueError(f"Course equivalences in {bundle_dir} do not match the manifest")
+    problem.__dict__['course_equivalences'] = equivalences
+
+    courses = read_table('courses.arrow').column('CourseNo').to_numpy(zero_copy_only=False)
+    edges = read_table('clash_edges.arrow')
+    problem.__dict__['clash_graph'] = clash_graph_from_edges(
+        courses, edges.column('course1_id').to_numpy(), edges.column('course2_id').to_numpy(), edges.column('weight').to_numpy())
+    return problem
+
+def __getattr__(name):
+    # Old scripts read greedy_timetabling.df_rooms and friends; load them on first access
+    if name in ('df_advised_courses', 'df_course_details', 'df_rooms', 'df_lecturer_prefs'):
+        return getattr(get_default_problem(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Load datasets
-df_advised_courses = pd.read_csv('AdvisedCourses.csv')
-df_course_details = pd.read_csv('CourseDetails.csv')
-df_rooms = pd.read_csv('Rooms.csv')
-df_lecturer_prefs = pd.read_csv('LecturerPreferences.csv')
 
 # Step 1: Preprocess and Create Mappings
-def load_and_preprocess_data():
+def load_and_preprocess_data(problem=None):
+    if problem is None:
+        problem = get_default_problem()
+    df_advised_courses = problem.df_advised_courses
+    df_course_details = problem.df_course_details
+    df_rooms = problem.df_rooms
+    df_lecturer_prefs = problem.df_lecturer_prefs
+
     # Map CourseNo to CourseName for quick lookup
     course_name_map = df_course_details.set_index('CourseNo')['CourseName'].to_dict()
 
@@ -29,6 +519,89 @@ def load_and_preprocess_data():
 
     return df_advised_courses, course_name_map, course_room_map, course_details_map, room_capacity_map, lecturer_prefs_map
 
+class CourseEquivalences:
+    """
+    Union-find over course codes that are taught as one course, such as cross-listed codes.
+
+    Each pair from the mapping file joins two codes; codes linked through any chain of
+    pairs end up in one group. A group is named by its codes joined with '/' in the
+    order they first appear in the mapping, e.g. 'CSOP1207/ITSE102/ITDR3102', which is
+    the id the course details use for it.
+
+    Args:
+    pairs (iterable): (code, equivalent code) pairs.
+    """
+
+    def __init__(self, pairs=()):
+        self.parent = {}
+        self.order = {}
+        for code, other in pairs:
+            self.union(code, other)
+
+    def _add(self, code):
+        if code not in self.parent:
+            self.parent[code] = code
+            self.order[code] = len(self.order)
+
+    def find(self, code):
+        """
+        Return the representative code of the group holding `code` (the code itself if it has no equivalents).
+        """
+        parent = self.parent
+        if code not in parent:
+            return code
+        while parent[code] != code:
+            # Path halving keeps the trees flat
+            parent[code] = parent[parent[code]]
+            code = parent[code]
+        return code
+
+    def union(self, code, other):
+        """
+        Put the two codes in one group; the representative is the one seen first.
+        """
+        self._add(code)
+        self._add(other)
+        root, other_root = self.find(code), self.find(other)
+        if root == other_root:
+            return
+        if self.order[other_root] < self.order[root]:
+            root, other_root = other_root, root
+        self.parent[other_root] = root
+
+    def mapping(self):
+        """
+        Return {code: merged id} for every code that has at least one equivalent.
+        """
+        groups = {}
+        for code in sorted(self.parent, key=self.order.get):
+            groups.setdefault(self.find(code), []).append(code)
+        return {code: '/'.join(group) for group in groups.values() if len(group) > 1 for code in group}
+
+    def key(self):
+        """
+        Return a short hash of the mapping, for cache keys that depend on it.
+        """
+        return hashlib.sha256(json.dumps(sorted(self.mapping().items())).encode()).hexdigest()[:16]
+
+    @classmethod
+    def from_csv(cls, file_path):
+        """
+        Read a mapping file with 'CourseNo' and 'EquivalentCourseNo' columns, one pair of codes per row.
+        """
+        df_pairs = pd.read_csv(file_path, usecols=['CourseNo', 'EquivalentCourseNo'], dtype=str).dropna()
+        return cls(zip(df_pairs['CourseNo'].str.strip(), df_pairs['EquivalentCourseNo'].str.strip()))
+
+def merge_equivalent_courses(df, equivalences):
+    """
+    Return the records with each CourseNo replaced by its merged id; codes without equivalents are kept.
+    """
+    if equivalences is None:
+        return df
+    mapping = equivalences.mapping()
+    merged = df['CourseNo'].map(mapping)
+    return df.assign(CourseNo=merged.where(merged.notna(), df['CourseNo']))
+
 
 # Function to calculate the clash count between two courses
 def get_clash_count(course1, course2, df):
@@ -36,30 +609,315 @@ def get_clash_count(course1, course2, df):
     students_course2 = set(df[df['CourseNo'] == course2]['StudentNo'])
     return len(students_course1 & students_course2)
 
-# Step 2: Graph Construction and Maximal Cliques Identification
-def construct_graph_and_find_cliques(df):
-    # List of all unique courses
-    courses = df['CourseNo'].unique()
+def build_incidence_matrix(df):
+    """
+    Build a sparse student x course incidence matrix from the advising records.
 
-    # Calculating clashes
-    clashes = []
-    for course1, course2 in combinations(courses, 2):
-        clash_count = get_clash_count(course1, course2, df)
-        if clash_count > 0:
-            clashes.append({'Course1': course1, 'Course2': course2, 'ClashCount': clash_count})
+    Args:
+    df (DataFrame): Advising records with 'StudentNo' and 'CourseNo' columns.
+
+    Returns:
+    tuple: (csr_matrix of 0/1 entries, array of course numbers indexing the columns)
+    """
+    # factorize keeps courses in order of first appearance, like df['CourseNo'].unique()
+    student_codes, students = pd.factorize(df['StudentNo'])
+    course_codes, courses = pd.factorize(df['CourseNo'])
 
-    # Convert to DataFrame
-    clashes_df = pd.DataFrame(clashes)
+    data = np.ones(len(df), dtype=np.int32)
+    shape = (len(students), len(courses))
+    incidence = sparse.coo_matrix((data, (student_codes, course_codes)), shape=shape).tocsr()
 
-    # Construct graph
+    # A student advised the same course twice still counts once
+    incidence.data[:] = 1
+    return incidence, np.asarray(courses)
+
+
+def _global_codes(values, ids):
+    # Factorize one chunk and map its codes onto running ids, assigned in order of first appearance
+    codes, uniques = pd.factorize(values)
+    lookup = np.fromiter((ids.setdefault(value, len(ids)) for value in uniques.tolist()), dtype=np.int64, count=len(uniques))
+    return lookup[codes]
+
+# Fewest pending records build_incidence_matrix_from_csv folds into its matrix at once
+INCIDENCE_FOLD_MIN = 1000000
+
+def build_incidence_matrix_from_csv(file_path, chunksize=100000, equivalences=None):
+    """
+    Stream the advising records in chunks into a sparse student x course incidence matrix.
+
+    Only the StudentNo and CourseNo columns are read and each chunk is turned into integer
+    codes. The codes are collected and folded into the matrix only once they outnumber the
+    pairs already in it (and at the end), so the work stays linear in the number of records
+    and peak memory follows the number of distinct (student, course) pairs rather than the
+    size of the file. Ids follow the order of first appearance, so the result matches
+    build_incidence_matrix on the whole file. With CourseEquivalences, each chunk's codes
+    are merged before they get ids.
+
+    Returns:
+    tuple: (csr_matrix of 0/1 entries, array of course numbers, array of student numbers)
+    """
+    student_ids, course_ids = {}, {}
+    incidence = sparse.csr_matrix((0, 0), dtype=np.int32)
+    pending_students, pending_courses, n_pending = [], [], 0
+
+    def fold(incidence):
+        # One COO build over the matrix so far and the pending codes; duplicates collapse to 1
+        existing = incidence.tocoo()
+        rows = np.concatenate([existing.row] + pending_students)
+        cols = np.concatenate([existing.col] + pending_courses)
+        shape = (len(student_ids), len(course_ids))
+        folded = sparse.coo_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=shape).tocsr()
+        folded.data[:] = 1
+        return folded
+
+    reader = pd.read_csv(file_path, usecols=['StudentNo', 'CourseNo'], dtype=str, chunksize=chunksize)
+    for chunk in reader:
+        chunk = merge_equivalent_courses(chunk.dropna(), equivalences)
+        pending_students.append(_global_codes(chunk['StudentNo'], student_ids).astype(np.int32))
+        pending_courses.append(_global_codes(chunk['CourseNo'], course_ids).astype(np.int32))
+        n_pending += len(chunk)
+        if n_pending >= max(incidence.nnz, INCIDENCE_FOLD_MIN):
+            incidence = fold(incidence)
+            pending_students, pending_courses, n_pending = [], [], 0
+    incidence = fold(incidence)
+
+    courses = np.array(list(course_ids), dtype=object)
+    students = np.array(list(student_ids), dtype=object)
+    return incidence, courses, students
+
+def hash_advising_csv(file_path, chunksize=100000, equivalences=None):
+    """
+    Chunked counterpart of hash_advising_records, reading only StudentNo and CourseNo as text.
+
+    With CourseEquivalences, each chunk is merged before it is hashed, so the result equals
+    hash_advising_records on the merged records of the whole file.
+    """
+    digest = hashlib.sha256()
+    for chunk in pd.read_csv(file_path, usecols=['StudentNo', 'CourseNo'], dtype=str, chunksize=chunksize):
+        digest.update(_advising_text_hashes(merge_equivalent_courses(chunk, equivalences)))
+    return digest.hexdigest()
+
+def clash_edges_from_incidence(incidence, courses):
+    """
+    Compute every pairwise clash count in one sparse product instead of a pairwise scan.
+
+    The clash count between two courses is the number of students advised for both,
+    which is exactly the off-diagonal of A^T.A for the incidence matrix A.
+
+    Returns:
+    tuple: (course numbers, row ids, column ids, clash counts) for the upper triangle,
+           row by row, i.e. in the same order as combinations(courses, 2).
+    """
+    clash_matrix = sparse.triu(incidence.T @ incidence, k=1).tocsr()
+    clash_matrix.sort_indices()
+
+    rows = np.repeat(np.arange(clash_matrix.shape[0]), np.diff(clash_matrix.indptr))
+    return courses, rows, clash_matrix.indices, clash_matrix.data
+
+def compute_clash_edges(df):
+    """
+    Compute the clash counts (see clash_edges_from_incidence) for advising records in a DataFrame.
+    """
+    return clash_edges_from_incidence(*build_incidence_matrix(df))
+
+def clash_graph_from_edges(courses, rows, cols, weights):
+    """
+    Build the weighted clash graph from course ids and clash counts.
+    """
+    courses = np.asarray(courses)
     G = nx.Graph()
-    for index, row in clashes_df.iterrows():
-        G.add_edge(row['Course1'], row['Course2'], weight=row['ClashCount'])
+    G.add_weighted_edges_from(zip(courses[rows].tolist(), courses[cols].tolist(), np.asarray(weights).tolist()))
+    return G
+
+def build_clash_graph(df):
+    """
+    Build the weighted clash graph directly from the advising records.
+    """
+    return clash_graph_from_edges(*compute_clash_edges(df))
 
-    # Find maximal cliques
-    cliques = list(nx.find_cliques(G))
+def assign_students_to_sections(df, df_course_details):
+    """
+    Split the advised students of each course into its NumberOfSections sections.
+
+    Students are ordered by the full set of courses they are advised for, so students
+    with the same or similar other courses sit next to each other, and each course's
+    students are cut into contiguous runs in that order. Students who share several
+    courses therefore tend to share a section in each of them, which keeps the clashes
+    between sections concentrated on few section pairs. Section sizes of a course differ
+    by at most one. Courses missing from the course details get a single section.
+
+    Args:
+    df (DataFrame): Advising records with 'StudentNo' and 'CourseNo' columns.
+    df_course_details (DataFrame): Course details with 'CourseNo' and 'NumberOfSections'.
+
+    Returns:
+    DataFrame: One row per (StudentNo, CourseNo) with its 0-based 'Section'.
+    """
+    records = df[['StudentNo', 'CourseNo']].drop_duplicates().reset_index(drop=True)
+
+    # Position of each student in the order of their sorted course lists
+    signature = records.sort_values('CourseNo').groupby('StudentNo', sort=False)['CourseNo'].agg('|'.join)
+    order = signature.reset_index().sort_values(['CourseNo', 'StudentNo'], kind='stable')['StudentNo']
+    position = pd.Series(np.arange(len(order)), index=order.values)
+
+    records['Position'] = records['StudentNo'].map(position)
+    records = records.sort_values(['CourseNo', 'Position'], kind='stable')
+    n_sections = records['CourseNo'].map(df_course_details.drop_duplicates('CourseNo').set_index('CourseNo')['NumberOfSections'])
+    n_sections = n_sections.fillna(1).clip(lower=1).astype(np.int64).values
+    rank = records.groupby('CourseNo', sort=False).cumcount().values
+    size = records.groupby('CourseNo', sort=False)['StudentNo'].transform('size').values
+    records['Section'] = rank * n_sections // size
+    return records.drop(columns='Position').sort_index().reset_index(drop=True)
+
+def build_section_clash_graph(df_sections):
+    """
+    Build the weighted clash graph between course sections from assign_students_to_sections.
+
+    Nodes are (course, section) pairs and an edge's weight is the number of students in
+    both sections, so sections of one course never clash with each other and a section
+    only clashes with the sections its own students attend. G.graph['sections'] is set,
+    which makes ClashOccupancy and TimetableValidator look sessions up by section.
+    """
+    student_codes, students = pd.factorize(df_sections['StudentNo'])
+    node_codes, nodes = pd.factorize(pd.MultiIndex.from_arrays([df_sections['CourseNo'], df_sections['Section']]))
+    data = np.ones(len(df_sections), dtype=np.int32)
+    incidence = sparse.coo_matrix((data, (student_codes, node_codes)), shape=(len(students), len(nodes))).tocsr()
+    incidence.data[:] = 1
+
+    labels = np.empty(len(nodes), dtype=object)
+    labels[:] = [(course, int(section)) for course, section in nodes]
+    G = clash_graph_from_edges(*clash_edges_from_incidence(incidence, labels))
+    G.graph['sections'] = True
+    return G
+
+
+# Step 2: Graph Construction and Maximal Cliques Identification
+def construct_graph_and_find_cliques(df, max_cliques=None):
+    # Construct the weighted clash graph
+    G = build_clash_graph(df)
+
+    # Find maximal cliques, stopping after max_cliques if a cap is given
+    cliques = list(islice(nx.find_cliques(G), max_cliques))
     return cliques
 
+class IncrementalClashGraph:
+    """
+    Clash graph and maximal cliques that can be updated as advising records change.
+
+    Adding or dropping a course for one student only touches the edges between that
+    course and the student's other courses, so an edit costs O(courses of the student)
+    and cliques are only re-enumerated around the courses whose edges changed.
+
+    Args:
+    df (DataFrame): Advising records with 'StudentNo' and 'CourseNo' columns.
+    graph (Graph): The clash graph of df if already built; it is then updated in place.
+    """
+
+    def __init__(self, df, graph=None):
+        self.graph = build_clash_graph(df) if graph is None else graph
+        self.student_courses = {}
+        for student, course in df[['StudentNo', 'CourseNo']].dropna().itertuples(index=False):
+            self.student_courses.setdefault(student, set()).add(course)
+        self.cliques = list(nx.find_cliques(self.graph))
+
+    def add_record(self, student, course):
+        """
+        Add one advising record and return the courses whose clash edges changed.
+        """
+        courses = self.student_courses.setdefault(student, set())
+        if course in courses:
+            return set()
+
+        touched = set()
+        for other in courses:
+            if self.graph.has_edge(course, other):
+                self.graph[course][other]['weight'] += 1
+            else:
+                self.graph.add_edge(course, other, weight=1)
+            touched.add(other)
+        courses.add(course)
+
+        if touched:
+            touched.add(course)
+        return touched
+
+    def remove_record(self, student, course):
+        """
+        Remove one advising record and return the courses whose clash edges changed.
+        """
+        courses = self.student_courses.get(student, set())
+        if course not in courses:
+            return set()
+        courses.discard(course)
+
+        touched = set()
+        for other in courses:
+            if self.graph.has_edge(course, other):
+                self.graph[course][other]['weight'] -= 1
+                if self.graph[course][other]['weight'] <= 0:
+                    self.graph.remove_edge(course, other)
+                touched.add(other)
+
+        if touched:
+            touched.add(course)
+        # A full rebuild only has courses that clash with something
+        for node in touched:
+            if node in self.graph and self.graph.degree(node) == 0:
+                self.graph.remove_node(node)
+        return touched
+
+    def apply_delta(self, delta):
+        """
+        Apply a batch of (StudentNo, CourseNo, action) records, action being 'add' or 'remove'.
+
+        Returns:
+        set: The courses whose clash edges changed.
+        """
+        touched = set()
+        for student, course, action in delta:
+            action = str(action).strip().lower()
+            if action == 'add':
+                touched |= self.add_record(student, course)
+            elif action == 'remove':
+                touched |= self.remove_record(student, course)
+            else:
+                raise ValueError(f"Unknown advising delta action '{action}' for {student}/{course}")
+
+        if touched:
+            self.refresh_cliques(touched)
+        return touched
+
+    def refresh_cliques(self, touched):
+        """
+        Recompute the maximal cliques around the touched courses only.
+
+        A maximal clique that avoids every touched course keeps all its edges and cannot
+        gain a new neighbour, so it stays maximal; everything else is re-enumerated.
+        """
+        kept = [clique for clique in self.cliques if touched.isdisjoint(clique)]
+        seen = {frozenset(clique) for clique in kept}
+        for node in touched:
+            if node not in self.graph:
+                continue
+            for clique in nx.find_cliques(self.graph, nodes=[node]):
+                key = frozenset(clique)
+                if key not in seen:
+                    seen.add(key)
+                    kept.append(clique)
+        self.cliques = kept
+        return self.cliques
+
+
+def load_advising_delta(file_path, equivalences=None):
+    """
+    Load an advising delta file with 'StudentNo', 'CourseNo' and 'Action' (add/remove) columns.
+
+    With CourseEquivalences, the course codes are merged like the full advising records.
+    """
+    df_delta = merge_equivalent_courses(pd.read_csv(file_path), equivalences)
+    return list(df_delta[['StudentNo', 'CourseNo', 'Action']].itertuples(index=False, name=None))
+
+
 # Step 3: Sort Cliques and Courses
 def sort_cliques_by_total_enrollment(cliques, df_course_details):
     # Map CourseNo to NumberOfAdvisedStudents
@@ -74,6 +932,77 @@ def sort_cliques_by_total_enrollment(cliques, df_course_details):
 
     return sorted_cliques
 
+def top_cliques_by_total_enrollment(cliques, df_course_details, top_k, max_cliques=None):
+    """
+    Keep only the top_k cliques by total advised students, streaming over the clique generator.
+
+    Only a heap of top_k cliques is held in memory, and at most max_cliques cliques are
+    enumerated. When every clique fits in top_k the result is the same list, in the same
+    order, as sort_cliques_by_total_enrollment.
+    """
+    advised_students_map = df_course_details.set_index('CourseNo')['NumberOfAdvisedStudents'].to_dict()
+
+    def total_students_in_clique(clique):
+        return sum(advised_students_map.get(course, 0) for course in clique)
+
+    return heapq.nlargest(top_k, islice(cliques, max_cliques), key=total_students_in_clique)
+
+def greedy_clique_cover(G, df_course_details):
+    """
+    Cover the clash graph with cliques grown greedily by NumberOfAdvisedStudents.
+
+    Each clique starts from the largest uncovered course and adds the largest neighbours
+    that clash with every course already in it. This gives at most one clique per course,
+    without enumerating the maximal cliques, and every course in G appears in some clique.
+    """
+    advised_students_map = df_course_details.set_index('CourseNo')['NumberOfAdvisedStudents'].to_dict()
+
+    def enrollment(course):
+        return advised_students_map.get(course, 0)
+
+    by_enrollment = sorted(G.nodes, key=enrollment, reverse=True)
+    covered = set()
+    cliques = []
+    for seed in by_enrollment:
+        if seed in covered:
+            continue
+        clique = [seed]
+        candidates = set(G.adj[seed])
+        for course in sorted(candidates, key=enrollment, reverse=True):
+            if course in candidates:
+                clique.append(course)
+                candidates &= set(G.adj[course])
+        covered.update(clique)
+        cliques.append(clique)
+
+    return sort_cliques_by_total_enrollment(cliques, df_course_details)
+
+def rank_cliques(G, df_course_details, mode='all', limit=None):
+    """
+    Produce the ordered clique list that drives scheduling.
+
+    Args:
+    G (Graph): The weighted clash graph.
+    df_course_details (DataFrame): Course details with 'NumberOfAdvisedStudents'.
+    mode (str): 'all' enumerates every maximal clique (capped at limit if given) and sorts
+                them, 'top-k' keeps the best `limit` cliques from a stream, 'cover' uses
+                greedy_clique_cover.
+    limit (int): Clique cap for 'all', or k for 'top-k'.
+
+    Returns:
+    list: Cliques sorted by total enrollment.
+    """
+    if mode == 'all':
+        cliques = list(islice(nx.find_cliques(G), limit))
+        return sort_cliques_by_total_enrollment(cliques, df_course_details)
+    if mode == 'top-k':
+        if limit is None:
+            raise ValueError("Clique mode 'top-k' needs a limit")
+        return top_cliques_by_total_enrollment(nx.find_cliques(G), df_course_details, limit)
+    if mode == 'cover':
+        return greedy_clique_cover(G, df_course_details)
+    raise ValueError(f"Unknown clique mode '{mode}'")
+
 def sort_cliques_by_size(cliques):
 
     cliques.sort(key=len, reverse=True)
@@ -89,40 +1018,834 @@ def sort_courses_in_clique(clique, df_course_details):
 
     return sorted_clique
 
-def generate_time_slots():
+# Default teaching week: Sunday-Thursday, 08:00-16:00, with Tuesday 10:00-12:00 kept free
+DEFAULT_DAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday']
+DEFAULT_START_HOUR = 8
+DEFAULT_END_HOUR = 16
+DEFAULT_BLACKOUTS = [('Tuesday', 10, 12)]
+
+# Preferred days for the sessions of a section, by number of sessions
+DEFAULT_DAY_PATTERNS = {
+    1: [('Sunday', ), ('Monday', ), ('Tuesday', ), ('Wednesday', ), ('Thursday', )],
+    2: [('Sunday', 'Tuesday'), ('Monday', 'Wednesday'), ('Monday', 'Thursday'), ('Tuesday', 'Thursday')],
+    3: [('Sunday', 'Tuesday', 'Thursday'), ('Monday', 'Wednesday', 'Thursday')],
+}
+
+
+class SlotCalendar:
+    """
+    Precomputed teaching week with integer slot ids.
+
+    Slot i is time_slots[i] (e.g. "Tuesday 12:00"), and day[i], hour[i] and blocked[i]
+    hold its day index, hour and whether it falls in a blackout window. The slots of each
+    day form one id range, and the valid start slots for every session length and day
+    are worked out once, as tuples and as bitmasks, so the scheduler does no string
+    parsing while it searches.
+
+    Args:
+    days (list): Day names in order.
+    start_hour (int): First teaching hour of the day.
+    end_hour (int): Last hour label of the day; sessions must end by this hour.
+    blackouts (list): (day, start_hour, end_hour) windows where no session may run.
+    day_patterns (dict): Number of sessions -> list of day tuples to try, in order. Every day
+        must be a calendar day. Defaults to DEFAULT_DAY_PATTERNS, minus patterns using days
+        the calendar does not have.
+    """
+
+    def __init__(self, days=None, start_hour=DEFAULT_START_HOUR, end_hour=DEFAULT_END_HOUR, blackouts=None, day_patterns=None):
+        self.days = list(DEFAULT_DAYS if days is None else days)
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        self.blackouts = list(DEFAULT_BLACKOUTS if blackouts is None else blackouts)
+
+        time_slots, slot_day, slot_hour = [], [], []
+        for day_id, day in enumerate(self.days):
+            for hour in range(start_hour, end_hour + 1):  # Include the end time
+                # Hours strictly inside a blackout window are not offered as slots at all
+                if any(day == b_day and b_start < hour < b_end for b_day, b_start, b_end in self.blackouts):
+                    continue
+                time_slots.append(f"{day} {hour:02d}:00")
+                slot_day.append(day_id)
+                slot_hour.append(hour)
+
+        self.time_slots = time_slots
+        self.slot_index = {time_slot: i for i, time_slot in enumerate(time_slots)}
+        self.day = np.array(slot_day, dtype=np.int16)
+        self.hour = np.array(slot_hour, dtype=np.int16)
+        self.blocked = np.array([is_restricted_time(self.days[d], h, h + 1, self.blackouts)
+                                 for d, h in zip(slot_day, slot_hour)], dtype=bool)
+
+        # The slots of each day form one contiguous id range
+        self.day_ranges = {}
+        for day_id, day in enumerate(self.days):
+            ids = [i for i, d in enumerate(slot_day) if d == day_id]
+            self.day_ranges[day] = range(ids[0], ids[-1] + 1) if ids else range(0)
+
+        # Valid start slots per session length, overall and per day, plus a bitmask per (length, day)
+        self.valid_starts_by_length = {}
+        self.valid_starts_by_day = {}
+        self.valid_start_masks = {}
+        for length in range(1, end_hour - start_hour + 1):
+            for day in self.days:
+                starts = tuple(i for i in self.day_ranges[day] if self._is_valid_start(i, length))
+                self.valid_starts_by_day[(length, day)] = starts
+                self.valid_start_masks[(length, day)] = sum(1 << i for i in starts)
+            self.valid_starts_by_length[length] = tuple(i for day in self.days for i in self.valid_starts_by_day[(length, day)])
+        self._valid_start_sets = {length: frozenset(starts) for length, starts in self.valid_starts_by_length.items()}
+
+        self.day_patterns_by_count = self._check_day_patterns(day_patterns)
+
+    def _check_day_patterns(self, day_patterns):
+        explicit = day_patterns is not None
+        patterns = {}
+        for n_sessions, combos in (day_patterns if explicit else DEFAULT_DAY_PATTERNS).items():
+            n_sessions = int(n_sessions)
+            patterns[n_sessions] = []
+            for combo in combos:
+                combo = tuple(combo)
+                if len(combo) != n_sessions:
+                    raise ValueError(f"Day pattern {combo} is listed for {n_sessions} sessions but has {len(combo)} days")
+                unknown = [day for day in combo if day not in self.day_ranges]
+                if unknown and explicit:
+                    raise ValueError(f"Day pattern {combo} uses {unknown[0]!r}, which is not a calendar day ({', '.join(self.days)})")
+                if not unknown:
+                    patterns[n_sessions].append(combo)
+        # A default entry left empty by the calendar falls back to day_patterns' distinct-day choices
+        return {n_sessions: combos for n_sessions, combos in patterns.items() if combos or explicit}
+
+    def day_patterns(self, n_sessions):
+        """
+        Return the day tuples to try for a section with n_sessions sessions.
+
+        Session counts missing from the pattern table get every choice of distinct days, in week order.
+        """
+        patterns = self.day_patterns_by_count.get(n_sessions)
+        if patterns is None:
+            patterns = self.day_patterns_by_count[n_sessions] = list(combinations(self.days, n_sessions))
+        return patterns
+
+    def valid_start_mask(self, length, day):
+        """
+        Return the valid starts for `length` hours on `day` as a bitmask over slot ids.
+        """
+        return self.valid_start_masks.get((length, day), 0)
+
+    def _is_valid_start(self, slot_id, length):
+        day_id, hour = self.day[slot_id], self.hour[slot_id]
+        end_id = slot_id + length - 1
+        if hour + length > self.end_hour or end_id >= len(self.time_slots):
+            return False
+        # The session must run over consecutive hours of the same day
+        if self.day[end_id] != day_id or self.hour[end_id] != hour + length - 1:
+            return False
+        return not self.blocked[slot_id:end_id + 1].any()
+
+    def valid_starts(self, length, day=None):
+        """
+        Return the slot ids where a session of `length` hours may start, optionally on one day only.
+        """
+        if day is None:
+            return self.valid_starts_by_length.get(length, ())
+        return self.valid_starts_by_day.get((length, day), ())
+
+    def is_valid_start(self, slot_id, length):
+        """
+        Check if a session of `length` hours may start at `slot_id`.
+        """
+        return slot_id in self._valid_start_sets.get(length, ())
+
+    def day_name(self, slot_id):
+        return self.days[self.day[slot_id]]
+
+
+_default_calendar = None
+
+def get_default_calendar():
+    """
+    Return the shared default SlotCalendar, building it on first use.
+    """
+    global _default_calendar
+    if _default_calendar is None:
+        _default_calendar = SlotCalendar()
+    return _default_calendar
+
+
+def order_courses_by_cliques(sorted_cliques, df_course_details):
+    """
+    Flatten the sorted cliques into one course order, the way the clique walk visits them.
+
+    Courses in each clique are sorted by the number of advised students (ascending) and
+    a course is kept only the first time it is seen.
+    """
+    advised_students_map = df_course_details.set_index('CourseNo')['NumberOfAdvisedStudents'].to_dict()
+
+    course_order = []
+    seen = set()
+    for clique in sorted_cliques:
+        for course in sorted(clique, key=lambda course: advised_students_map.get(course, 0)):
+            if course not in seen:
+                seen.add(course)
+                course_order.append(course)
+    return course_order
+
+def order_courses_by_weighted_degree(G):
+    """
+    Order courses by total clash weight with all other courses, largest first.
+    """
+    weighted_degree = dict(G.degree(weight='weight'))
+    return sorted(G.nodes, key=lambda course: weighted_degree[course], reverse=True)
+
+def order_courses_by_dsatur(G):
+    """
+    Order courses by saturation degree (DSATUR) on the clash graph.
+
+    At each step the next course is the one whose clashing courses already use the most
+    distinct colours, ties broken by weighted degree. Stale heap entries are skipped, so
+    the whole order costs O(E log V).
+    """
+    weighted_degree = dict(G.degree(weight='weight'))
+    position = {course: i for i, course in enumerate(G.nodes)}
+    neighbour_colours = {course: set() for course in G.nodes}
+    colours = {}
+
+    heap = [(0, -weighted_degree[course], position[course], course) for course in G.nodes]
+    heapq.heapify(heap)
+
+    course_order = []
+    while heap:
+        neg_saturation, _, _, course = heapq.heappop(heap)
+        if course in colours or -neg_saturation != len(neighbour_colours[course]):
+            continue
+
+        # Smallest colour not used by a clashing course
+        colour = 0
+        while colour in neighbour_colours[course]:
+            colour += 1
+        colours[course] = colour
+        course_order.append(course)
+
+        for neighbour in G.adj[course]:
+            if neighbour not in colours and colour not in neighbour_colours[neighbour]:
+                neighbour_colours[neighbour].add(colour)
+                heapq.heappush(heap, (-len(neighbour_colours[neighbour]), -weighted_degree[neighbour],
+                                      position[neighbour], neighbour))
+
+    return course_order
+
+def order_courses(G, df_course_details, method='cliques', clique_mode='all', clique_limit=None):
+    """
+    Produce the global course order for scheduling.
+
+    Args:
+    G (Graph): The weighted clash graph.
+    df_course_details (DataFrame): Course details.
+    method (str): 'cliques' (walk the sorted cliques), 'dsatur' or 'weighted-degree'.
+    clique_mode (str): Passed to rank_cliques for the 'cliques' method.
+    clique_limit (int): Passed to rank_cliques for the 'cliques' method.
+
+    Returns:
+    list: Course numbers in the order they should be scheduled.
+    """
+    if method == 'cliques':
+        sorted_cliques = rank_cliques(G, df_course_details, clique_mode, clique_limit)
+        return order_courses_by_cliques(sorted_cliques, df_course_details)
+    if method == 'dsatur':
+        return order_courses_by_dsatur(G)
+    if method == 'weighted-degree':
+        return order_courses_by_weighted_degree(G)
+    raise ValueError(f"Unknown course ordering '{method}'")
+
+ORDERING_METHODS = ['cliques', 'dsatur', 'weighted-degree']
+
+
+def generate_time_slots(days=None, start_hour=DEFAULT_START_HOUR, end_hour=DEFAULT_END_HOUR, blackouts=None):
     """
     Generate a list of valid time slots for each day of the week.
-    Exclude Tuesday 10:00-12:00.
-    """
-    # Define working hours and days
-    start_time = datetime.time(8, 0)
-    end_time = datetime.time(16, 0)
-    days_of_week = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday']
-    
-    # Generate time slots
-    time_slots = []
-    delta = datetime.timedelta(hours=1)
-    for day in days_of_week:
-        current_time = datetime.datetime.combine(datetime.date.today(), start_time)
-        while current_time.time() <= end_time:  # Include the end time
-            if not (day == 'Tuesday' and (current_time.time() > datetime.time(10, 0) and current_time.time() < datetime.time(12, 0))):  # Exclude until 12:00
-                time_slots.append(f"{day} {current_time.strftime('%H:%M')}")
-            current_time += delta
-    return time_slots
+    Exclude Tuesday 10:00-12:00 (or the given blackout windows).
+    """
+    return SlotCalendar(days, start_hour, end_hour, blackouts).time_slots
+
+
+class AvailabilityTable:
+    """
+    Track the availability of a set of resources (rooms or lecturers) over the time slots.
+
+    Each resource is stored as one integer bitmask where bit i is set while time slot i
+    is free, so "free for k consecutive slots" is a single mask AND. Indexing the table
+    as availability[resource][time_slot] still works like the old nested dictionaries.
+    """
+
+    def __init__(self, resources, time_slots):
+        self.time_slots = list(time_slots)
+        self.slot_index = {time_slot: i for i, time_slot in enumerate(self.time_slots)}
+        self.full_mask = (1 << len(self.time_slots)) - 1
+        self.masks = {resource: self.full_mask for resource in resources}
+
+    def span_mask(self, start_index, length):
+        """
+        Return the bitmask covering `length` slots from `start_index`, or None if it runs past the last slot.
+        """
+        if start_index < 0 or start_index + length > len(self.time_slots):
+            return None
+        return ((1 << length) - 1) << start_index
+
+    def is_free(self, resource, start_index, length=1):
+        """
+        Check if the resource is free for `length` consecutive slots from `start_index`.
+        """
+        mask = self.span_mask(start_index, length)
+        return mask is not None and self.masks[resource] & mask == mask
+
+    def free_resources(self, resources, start_index, length=1):
+        """
+        Return the resources (in the given order) that are free for the whole span.
+        """
+        mask = self.span_mask(start_index, length)
+        if mask is None:
+            return []
+        masks = self.masks
+        return [resource for resource in resources if resource in masks and masks[resource] & mask == mask]
+
+    def free_starts(self, resources, length=1):
+        """
+        Return a bitmask of the start slots where at least one of the resources is free for `length` slots.
+        """
+        any_free = 0
+        for resource in resources:
+            mask = self.masks.get(resource)
+            if mask is None:
+                continue
+            span_free = mask
+            for k in range(1, length):
+                span_free &= mask >> k
+            any_free |= span_free
+        return any_free
+
+    def choose(self, resources, start_index, length=1, ranks=None, overload=False):
+        """
+        Return the first of the resources that is free for the whole span, or None.
+        """
+        return next(iter(self.free_resources(resources, start_index, length)), None)
+
+    def book(self, resource, start_index, length=1):
+        """
+        Mark the resource as busy from `start_index`, clipped at the last slot.
+        """
+        length = min(length, len(self.time_slots) - start_index)
+        if length > 0:
+            self.masks[resource] &= ~(((1 << length) - 1) << start_index)
+
+    def release(self, resource, start_index, length=1):
+        """
+        Mark the resource as free again from `start_index`, clipped at the last slot.
+        """
+        length = min(length, len(self.time_slots) - start_index)
+        if length > 0:
+            self.masks[resource] |= ((1 << length) - 1) << start_index
+
+    # Dictionary-style view: availability[resource][time_slot]
+    def __getitem__(self, resource):
+        if resource not in self.masks:
+            raise KeyError(resource)
+        return _ResourceSlotsView(self, resource)
+
+    def __contains__(self, resource):
+        return resource in self.masks
+
+    def __iter__(self):
+        return iter(self.masks)
+
+    def __len__(self):
+        return len(self.masks)
+
+    def keys(self):
+        return self.masks.keys()
+
+    def items(self):
+        return ((resource, self[resource]) for resource in self.masks)
+
+    def values(self):
+        return (self[resource] for resource in self.masks)
+
+    def to_dict(self):
+        """
+        Return a plain nested {resource: {time_slot: bool}} copy.
+        """
+        return {resource: dict(view.items()) for resource, view in self.items()}
+
+
+class _ResourceSlotsView:
+    """
+    Read/write {time_slot: bool} view of one resource in an AvailabilityTable.
+    """
+
+    def __init__(self, table, resource):
+        self.table = table
+        self.resource = resource
+
+    def __getitem__(self, time_slot):
+        return bool(self.table.masks[self.resource] >> self.table.slot_index[time_slot] & 1)
+
+    def __setitem__(self, time_slot, available):
+        if available:
+            self.table.release(self.resource, self.table.slot_index[time_slot])
+        else:
+            self.table.book(self.resource, self.table.slot_index[time_slot])
+
+    def __contains__(self, time_slot):
+        return time_slot in self.table.slot_index
+
+    def __iter__(self):
+        return iter(self.table.time_slots)
+
+    def __len__(self):
+        return len(self.table.time_slots)
+
+    def keys(self):
+        return list(self.table.time_slots)
+
+    def items(self):
+        return [(time_slot, self[time_slot]) for time_slot in self.table.time_slots]
+
+    def values(self):
+        return [self[time_slot] for time_slot in self.table.time_slots]
+
+
+class LecturerAvailability(AvailabilityTable):
+    """
+    AvailabilityTable for lecturers that also keeps each lecturer's teaching load.
+
+    book and release add or subtract the hours whose state actually changes, so the load
+    stays in step on every path that books lecturers at O(1) per session. max_load holds
+    each lecturer's MaxLoad in contact hours; a lecturer without one has no limit.
+    """
+
+    def __init__(self, resources, time_slots, max_load=None):
+        super().__init__(resources, time_slots)
+        self.load = dict.fromkeys(self.masks, 0)
+        self.max_load = {lecturer: limit for lecturer, limit in (max_load or {}).items() if lecturer in self.masks}
+
+    def remaining(self, lecturer):
+        """
+        Return the hours the lecturer has left before MaxLoad (negative when over it), or math.inf with no limit.
+        """
+        limit = self.max_load.get(lecturer)
+        return math.inf if limit is None else limit - self.load[lecturer]
+
+    def choose(self, resources, start_index, length=1, ranks=None, overload=False):
+        """
+        Return the lecturer to book for a session, or None if none of them can take it.
+
+        Free lecturers with `length` hours of load left come first, the lowest preference rank
+        winning (`ranks` runs parallel to `resources`, as in build_resource_index's
+        'lecturer_ranks') and then the most load left. While any of `resources` still has
+        that much load left, even one busy at this start, nobody is taken past MaxLoad and
+        None is returned instead, so the caller tries another start. Only when none of them
+        has, or with overload=True, does the session go to the free lecturer least over it.
+        """
+        mask = self.span_mask(start_index, length)
+        if mask is None:
+            return None
+        masks = self.masks
+        best, best_key = None, None
+        room_left = False
+        for lecturer, rank in zip(resources, ranks if ranks is not None else repeat(0)):
+            if best_key is not None and best_key[0] == 0 and rank > best_key[1]:
+                break  # Candidates come in rank order, so no later one can win
+            if lecturer not in masks:
+                continue
+            remaining = self.remaining(lecturer)
+            if remaining >= length:
+                room_left = True
+                key = (0, rank, -remaining)
+            else:
+                key = (1, -remaining, rank)
+            if masks[lecturer] & mask == mask and (best_key is None or key < best_key):
+                best, best_key = lecturer, key
+        if best_key is not None and best_key[0] == 1 and room_left and not overload:
+            return None
+        return best
+
+    def book(self, resource, start_index, length=1):
+        length = min(length, len(self.time_slots) - start_index)
+        if length > 0:
+            span = ((1 << length) - 1) << start_index
+            self.load[resource] += (self.masks[resource] & span).bit_count()
+            self.masks[resource] &= ~span
+
+    def release(self, resource, start_index, length=1):
+        length = min(length, len(self.time_slots) - start_index)
+        if length > 0:
+            span = ((1 << length) - 1) << start_index
+            self.load[resource] -= (span & ~self.masks[resource]).bit_count()
+            self.masks[resource] |= span
+
+    def load_report(self):
+        """
+        Return a DataFrame of each lecturer's MaxLoad, booked hours (Load) and hours left (Remaining), in file order.
+        """
+        df_load = pd.DataFrame({'FacultyID': list(self.load), 'Load': list(self.load.values())})
+        df_load.insert(1, 'MaxLoad', df_load['FacultyID'].map(self.max_load))
+        df_load['Remaining'] = df_load['MaxLoad'] - df_load['Load']
+        return df_load
+
+
+class ClashOccupancy:
+    """
+    Per-slot index of the student clashes each course would cause if it were placed there.
+
+    clash_weight[slot][course] is the total clash-graph edge weight between `course` and
+    the courses already scheduled in `slot`, i.e. the students it would clash with in that
+    hour. It is updated when a session is placed, so checking a candidate slot is a
+    dictionary lookup per hour of the session. On a
+    section-level graph (see build_section_clash_graph) the keys are (course, section)
+    nodes instead; node() gives the key for a section either way.
+
+    Args:
+    G (Graph): The weighted clash graph.
+    n_slots (int): Number of time slots.
+    max_clash_weight (int): Most clashing students allowed in any hour of a placement; None only tracks clashes.
+    """
+
+    def __init__(self, G, n_slots, max_clash_weight=None):
+        self.graph = G
+        self.by_section = G.graph.get('sections', False)
+        self.max_clash_weight = max_clash_weight
+        self.clash_weight = [{} for _ in range(n_slots)]
+        self.courses = [{} for _ in range(n_slots)]
+
+    def node(self, course, section=None):
+        """
+        Return the clash graph node a session of the section is recorded under.
+        """
+        return (course, section) if self.by_section else course
+
+    def weight(self, course, start_index, length=1):
+        """
+        Return the clash weight of placing `course` over `length` slots from `start_index`.
+
+        This is summed over the hours of the session (student-hours), the unit of the clash
+        totals and of the local-search cost.
+        """
+        end_index = min(start_index + length, len(self.clash_weight))
+        return sum(self.clash_weight[i].get(course, 0) for i in range(start_index, end_index))
+
+    def students(self, course, start_index, length=1):
+        """
+        Return the most students `course` would clash with in any one hour of the session.
+        """
+        end_index = min(start_index + length, len(self.clash_weight))
+        return max((self.clash_weight[i].get(course, 0) for i in range(start_index, end_index)), default=0)
+
+    def allows(self, course, start_index, length=1):
+        """
+        Check if placing the course clashes with at most max_clash_weight students in every hour.
+        """
+        return self.max_clash_weight is None or self.students(course, start_index, length) <= self.max_clash_weight
+
+    def _update(self, course, start_index, length, sign):
+        neighbours = self.graph.adj[course] if course in self.graph else {}
+        for i in range(start_index, min(start_index + length, len(self.clash_weight))):
+            count = self.courses[i].get(course, 0) + sign
+            if count:
+                self.courses[i][course] = count
+            else:
+                self.courses[i].pop(course, None)
+            slot_weights = self.clash_weight[i]
+            for neighbour, data in neighbours.items():
+                slot_weights[neighbour] = slot_weights.get(neighbour, 0) + sign * data['weight']
+
+    def add(self, course, start_index, length=1):
+        """
+        Record a session of `course` over `length` slots from `start_index`.
+        """
+        self._update(course, start_index, length, 1)
+
+    def remove(self, course, start_index, length=1):
+        """
+        Forget a session recorded with add.
+        """
+        self._update(course, start_index, length, -1)
+
+
+class AssignmentTable:
+    """
+    Compact store of the session assignments that make up a timetable.
+
+    Every session is one row of parallel integer arrays: course id, section, session
+    index within the section, start slot id, room id, lecturer id and length, with -1
+    for an unscheduled slot, room or lecturer. Rows are indexed by section, by every slot
+    they cover, by room and by lecturer, so "what sits in this slot" or "what does this
+    room host" is a set lookup. The (course, section) -> list of session dicts shape is
+    only built on export, by to_timetable.
+
+    Args:
+    calendar (SlotCalendar): Calendar whose slot ids the table stores.
+    capacity (int): Initial number of rows; the arrays double when full.
+    """
+
+    COLUMNS = ('course_id', 'section', 'session_idx', 'slot_id', 'room_id', 'lecturer_id', 'length')
+
+    def __init__(self, calendar=None, capacity=256):
+        if calendar is None:
+            calendar = get_default_calendar()
+        self.calendar = calendar
+        self.size = 0
+        self.data = {name: np.full(max(1, capacity), -1, dtype=np.int32) for name in self.COLUMNS}
+        self.courses, self.course_ids = [], {}
+        self.rooms, self.room_ids = [], {}
+        self.lecturers, self.lecturer_ids = [], {}
+        # Why a session is unscheduled, by row; rows without a reason are not stored
+        self.reasons = {}
+        self._build_index()
+
+    def _build_index(self):
+        self.section_rows = {}
+        self.slot_rows = [set() for _ in self.calendar.time_slots]
+        self.room_rows = {}
+        self.lecturer_rows = {}
+        course_id, section = self.column('course_id').tolist(), self.column('section').tolist()
+        for row in range(self.size):
+            self.section_rows.setdefault((course_id[row], section[row]), []).append(row)
+            self._index(row)
+
+    # Only the arrays and names are pickled; the row indexes are rebuilt on load
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['data'] = {name: self.column(name).copy() for name in self.COLUMNS}
+        for name in ('section_rows', 'slot_rows', 'room_rows', 'lecturer_rows'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_index()
+
+    @staticmethod
+    def _intern(value, ids, values):
+        if value is None:
+            return -1
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(values)
+            values.append(value)
+        return index
+
+    def column(self, name):
+        """
+        Return the used part of one column array (a view, not a copy).
+        """
+        return self.data[name][:self.size]
+
+    def _index(self, row):
+        data = self.data
+        slot_id, length = int(data['slot_id'][row]), int(data['length'][row])
+        if slot_id >= 0:
+            for i in range(slot_id, min(slot_id + length, len(self.slot_rows))):
+                self.slot_rows[i].add(row)
+        room_id, lecturer_id = int(data['room_id'][row]), int(data['lecturer_id'][row])
+        if room_id >= 0:
+            self.room_rows.setdefault(room_id, set()).add(row)
+        if lecturer_id >= 0:
+            self.lecturer_rows.setdefault(lecturer_id, set()).add(row)
+
+    def _unindex(self, row):
+        data = self.data
+        slot_id, length = int(data['slot_id'][row]), int(data['length'][row])
+        if slot_id >= 0:
+            for i in range(slot_id, min(slot_id + length, len(self.slot_rows))):
+                self.slot_rows[i].discard(row)
+        room_id, lecturer_id = int(data['room_id'][row]), int(data['lecturer_id'][row])
+        if room_id >= 0:
+            self.room_rows[room_id].discard(row)
+        if lecturer_id >= 0:
+            self.lecturer_rows[lecturer_id].discard(row)
+
+    def add_session(self, course, section, slot_id, room, lecturer, length, reason=None):
+        """
+        Append a session to its section and return its row; slot_id None leaves it unscheduled.
+        """
+        if self.size == len(self.data['course_id']):
+            self.data = {name: np.concatenate([array, np.full(len(array), -1, dtype=np.int32)])
+                         for name, array in self.data.items()}
+        row = self.size
+        self.size += 1
+        course_id = self._intern(course, self.course_ids, self.courses)
+        rows = self.section_rows.setdefault((course_id, section), [])
+        data = self.data
+        data['course_id'][row] = course_id
+        data['section'][row] = section
+        data['session_idx'][row] = len(rows)
+        data['length'][row] = length
+        rows.append(row)
+        self.set_session(row, slot_id, room, lecturer, reason=reason)
+        return row
+
+    def add_section(self, course, section, sessions):
+        """
+        Append the session dicts returned by schedule_course_sessions to a section.
+        """
+        slot_index = self.calendar.slot_index
+        for session in sessions:
+            slot_id = None if session['time_slot'] is None else slot_index[session['time_slot']]
+            self.add_session(course, section, slot_id, session['room'], session['lecturer'],
+                             session.get('length', 1), session.get('reason'))
+
+    def set_session(self, row, slot_id, room, lecturer, length=None, reason=None):
+        """
+        Move a session to a new start slot, room and lecturer; slot_id None unschedules it.
+        """
+        self._unindex(row)
+        data = self.data
+        if length is not None:
+            data['length'][row] = length
+        data['slot_id'][row] = -1 if slot_id is None else slot_id
+        data['room_id'][row] = self._intern(room, self.room_ids, self.rooms)
+        data['lecturer_id'][row] = self._intern(lecturer, self.lecturer_ids, self.lecturers)
+        if reason is None:
+            self.reasons.pop(row, None)
+        else:
+            self.reasons[row] = reason
+        self._index(row)
+
+    # Per-row lookups
+    def course_of(self, row):
+        return self.courses[self.data['course_id'][row]]
+
+    def slot_of(self, row):
+        slot_id = int(self.data['slot_id'][row])
+        return None if slot_id < 0 else slot_id
+
+    def room_of(self, row):
+        room_id = self.data['room_id'][row]
+        return None if room_id < 0 else self.rooms[room_id]
+
+    def lecturer_of(self, row):
+        lecturer_id = self.data['lecturer_id'][row]
+        return None if lecturer_id < 0 else self.lecturers[lecturer_id]
+
+    def section_of(self, row):
+        return int(self.data['section'][row])
+
+    def length_of(self, row):
+        return int(self.data['length'][row])
+
+    def session(self, row):
+        """
+        Return one row as a session dict: time_slot, room, lecturer, length and any reason.
+        """
+        slot_id = self.slot_of(row)
+        session = {'time_slot': None if slot_id is None else self.calendar.time_slots[slot_id],
+                   'room': self.room_of(row), 'lecturer': self.lecturer_of(row), 'length': self.length_of(row)}
+        if row in self.reasons:
+            session['reason'] = self.reasons[row]
+        return session
+
+    # Index lookups
+    def rows_for_section(self, course, section):
+        """
+        Return the rows of a section in session order ([] for an unknown section).
+        """
+        course_id = self.course_ids.get(course)
+        return self.section_rows.get((course_id, section), []) if course_id is not None else []
+
+    def rows_at_slot(self, slot_id):
+        """
+        Return the rows of the sessions covering a slot.
+        """
+        return self.slot_rows[slot_id]
+
+    def rows_for_room(self, room):
+        return self.room_rows.get(self.room_ids.get(room), set())
+
+    def rows_for_lecturer(self, lecturer):
+        return self.lecturer_rows.get(self.lecturer_ids.get(lecturer), set())
+
+    def sections(self):
+        """
+        Iterate over the (course, section) keys in the order they were added.
+        """
+        return ((self.courses[course_id], section) for course_id, section in self.section_rows)
+
+    def unscheduled_rows(self):
+        return np.flatnonzero(self.column('slot_id') < 0)
+
+    def row_order(self):
+        """
+        Return every row grouped by section, in the order sections were added, then by session.
+        """
+        return np.fromiter(chain.from_iterable(self.section_rows.values()), dtype=np.int64, count=self.size)
+
+    def __contains__(self, key):
+        return bool(self.rows_for_section(*key))
+
+    def __len__(self):
+        return self.size
+
+    # Conversion to and from the (course, section) -> list of session dicts shape
+    @classmethod
+    def from_timetable(cls, timetable, calendar=None):
+        table = cls(calendar, capacity=sum(len(sessions) for sessions in timetable.values()))
+        for (course, section), sessions in timetable.items():
+            table.add_section(course, section, sessions)
+        return table
+
+    def to_timetable(self):
+        timetable = {}
+        for (course_id, section), rows in self.section_rows.items():
+            timetable[(self.courses[course_id], section)] = [self.session(row) for row in rows]
+        return timetable
+
+    def to_frame(self):
+        """
+        Return one row per session (Course, Section, TimeSlot, Room, Lecturer) in section order.
+        """
+        order = self.row_order()
+
+        def labels(values, ids):
+            # Id -1 picks the trailing None
+            return np.array(list(values) + [None], dtype=object)[self.column(ids)[order]]
+
+        return pd.DataFrame({
+            'Course': labels(self.courses, 'course_id'),
+            'Section': self.column('section')[order],
+            'TimeSlot': labels(self.calendar.time_slots, 'slot_id'),
+            'Room': labels(self.rooms, 'room_id'),
+            'Lecturer': labels(self.lecturers, 'lecturer_id'),
+        })
+
+
+def as_assignment_table(timetable, calendar=None):
+    """
+    Return the timetable as an AssignmentTable, converting a (course, section) -> sessions dict.
+    """
+    if isinstance(timetable, AssignmentTable):
+        return timetable
+    return AssignmentTable.from_timetable(timetable, calendar)
+
+def _same_shape(timetable, assignments):
+    # Hand back a dict when the caller passed one in
+    return assignments if isinstance(timetable, AssignmentTable) else assignments.to_timetable()
 
 
 def initialize_room_availability(df_rooms, time_slots):
     """
-    Initialize a dictionary to track the availability of each room for each time slot.
+    Initialize an AvailabilityTable to track the availability of each room for each time slot.
     """
-    room_availability = {row['RoomNo']: {time_slot: True for time_slot in time_slots} for _, row in df_rooms.iterrows()}
+    room_availability = AvailabilityTable(df_rooms['RoomNo'], time_slots)
     return room_availability
 
 def initialize_lecturer_availability(df_lecturer_prefs, time_slots):
     """
-    Initialize a dictionary to track the availability of each lecturer for each time slot.
+    Initialize a LecturerAvailability to track the availability and load of each lecturer for each time slot.
+
+    Lecturers with a MaxLoad are limited to that many contact hours when lecturers are chosen.
     """
-    lecturer_availability = {row['FacultyID']: {time_slot: True for time_slot in time_slots} for _, row in df_lecturer_prefs.iterrows()}
+    max_load = None
+    if 'MaxLoad' in df_lecturer_prefs:
+        max_load = {lecturer: int(limit) for lecturer, limit in zip(df_lecturer_prefs['FacultyID'], df_lecturer_prefs['MaxLoad'])
+                    if pd.notna(limit)}
+    lecturer_availability = LecturerAvailability(df_lecturer_prefs['FacultyID'], time_slots, max_load)
     return lecturer_availability
 
 def find_available_resources(course_info, room_availability, lecturer_availability, time_slots):
@@ -158,14 +1881,20 @@ def update_availability(room_availability, lecturer_availability, room, lecturer
     Update the availability of the room and lecturer for the duration of the session.
 
     Args:
-    room_availability (dict): A dictionary tracking the availability of rooms.
-    lecturer_availability (dict): A dictionary tracking the availability of lecturers.
+    room_availability (AvailabilityTable or dict): Tracks the availability of rooms.
+    lecturer_availability (AvailabilityTable or dict): Tracks the availability of lecturers.
     room (str): The room identifier.
     lecturer (str): The lecturer identifier.
     start_time_slot (str): The starting time slot of the session.
     session_length (int): The length of the session in hours.
     time_slots (list): The list of all possible time slots.
     """
+    if isinstance(room_availability, AvailabilityTable) and isinstance(lecturer_availability, AvailabilityTable):
+        start_index = room_availability.slot_index[start_time_slot]
+        room_availability.book(room, start_index, session_length)
+        lecturer_availability.book(lecturer, start_index, session_length)
+        return
+
     start_index = time_slots.index(start_time_slot)
     for i in range(session_length):
         # Calculate the index for the current time slot
@@ -224,25 +1953,137 @@ def lecturer_prefers_course(lecturer, course_info, lecturer_prefs):
     # If the course is not found in the lecturer's preferences or lecturer not in DataFrame, return False
     return False
 
+def build_resource_index(df_rooms, df_lecturer_prefs):
+    """
+    Build lookup maps for rooms and lecturers once, so the scheduler does not filter DataFrames per check.
+
+    Args:
+    df_rooms (DataFrame): Rooms with 'RoomNo' and 'Type' columns.
+    df_lecturer_prefs (DataFrame): Lecturers with 'FacultyID' and 'Pref1'..'Pref5' columns.
+
+    Returns:
+    dict: 'room_type' (room -> type), 'rooms_by_type' (type -> rooms), 'room_capacity' (room -> seats),
+          'rooms_by_capacity' and 'room_capacities' (type -> rooms and their seats, smallest first),
+          'lecturers_by_course' (course -> lecturers who prefer it, Pref1 first and file order among equals),
+          'lecturer_ranks' (course -> the preference rank of each of those lecturers)
+          and 'preference_rank' ((lecturer, course) -> 1 for Pref1 .. 5 for Pref5).
+    """
+    room_type = dict(zip(df_rooms['RoomNo'], df_rooms['Type']))
+
+    rooms_by_type = {}
+    for room, rtype in room_type.items():
+        rooms_by_type.setdefault(rtype, []).append(room)
+
+    # Rooms of each type sorted by capacity (file order among equals) for best-fit allocation
+    capacities = df_rooms['Capacity'] if 'Capacity' in df_rooms else pd.Series(0, index=df_rooms.index)
+    room_capacity = {room: int(capacity) if pd.notna(capacity) else 0 for room, capacity in zip(df_rooms['RoomNo'], capacities)}
+    rooms_by_capacity = {rtype: sorted(rooms, key=room_capacity.get) for rtype, rooms in rooms_by_type.items()}
+    room_capacities = {rtype: [room_capacity[room] for room in rooms] for rtype, rooms in rooms_by_capacity.items()}
+
+    lecturers_by_course = {}
+    preference_rank = {}
+    pref_cols = ['Pref1', 'Pref2', 'Pref3', 'Pref4', 'Pref5']
+    for lecturer, *prefs in df_lecturer_prefs[['FacultyID'] + pref_cols].itertuples(index=False):
+        for rank, course_no in enumerate(prefs, start=1):
+            if pd.notna(course_no):
+                eligible = lecturers_by_course.setdefault(course_no, [])
+                if lecturer not in eligible:
+                    eligible.append(lecturer)
+                    preference_rank[(lecturer, course_no)] = rank
+
+    # Each course's lecturers in preference order, so LecturerAvailability.choose can break ties on load
+    lecturer_ranks = {}
+    for course_no, eligible in lecturers_by_course.items():
+        eligible.sort(key=lambda lecturer: preference_rank[(lecturer, course_no)])
+        lecturer_ranks[course_no] = [preference_rank[(lecturer, course_no)] for lecturer in eligible]
+
+    return {'room_type': room_type, 'rooms_by_type': rooms_by_type, 'room_capacity': room_capacity,
+            'rooms_by_capacity': rooms_by_capacity, 'room_capacities': room_capacities, 'lecturers_by_course': lecturers_by_course,
+            'lecturer_ranks': lecturer_ranks, 'preference_rank': preference_rank}
+
+def best_fit_order(resource_index, room_type, students):
+    """
+    Yield the rooms of a type in best-fit order for a section of `students`.
+
+    The smallest room that seats the section comes first, found by bisection on the
+    sorted capacities, then the larger rooms, then the smaller ones from the largest
+    down, so a section only gets a room that is too small when none that fits is free.
+    """
+    rooms = resource_index['rooms_by_capacity'].get(room_type, [])
+    first_fit = bisect.bisect_left(resource_index['room_capacities'].get(room_type, []), students)
+    for i in chain(range(first_fit, len(rooms)), range(first_fit - 1, -1, -1)):
+        yield rooms[i]
+
+def best_fit_room(room_availability, resource_index, room_type, students, start_index, length=1):
+    """
+    Return the first room in best_fit_order that is free for the whole session, or None.
+    """
+    for room in best_fit_order(resource_index, room_type, students):
+        if room in room_availability and room_availability.is_free(room, start_index, length):
+            return room
+    return None
+
+def section_size(course_info):
+    """
+    Return the AverageStudentsPerSection of a course, or 0 when it is not known.
+    """
+    students = course_info.get('AverageStudentsPerSection', 0)
+    return 0 if pd.isna(students) else students
+
 # Step 4: Timetabling with Section, Room, and Lecturer Assignment
 
-                                      
-def find_available_resources_for_session(course_info, room_availability, lecturer_availability, time_slot, length, time_slots):
+
+def find_available_resources_for_session(course_info, room_availability, lecturer_availability, time_slot, length, time_slots, resource_index,
+                                         overload=False):
     """
     Find an available time slot, room, and lecturer for a specific session length.
+
+    Only rooms of the course's type and lecturers who prefer the course are tried,
+    using the maps from build_resource_index. The room is the best fit for the
+    section's AverageStudentsPerSection (see best_fit_order), and the lecturer is
+    picked by lecturer_availability.choose: by preference rank among those with
+    load left under their MaxLoad. With overload=True the lecturer may be taken past
+    MaxLoad even while another qualified lecturer has load left.
     """
-    for room in room_availability:
-        if room_availability[room][time_slot] and room_matches_course(room, course_info, df_rooms):
-            for lecturer in lecturer_availability:
-                if lecturer_availability[lecturer][time_slot] and lecturer_prefers_course(lecturer, course_info, df_lecturer_prefs):
+
+    rooms = resource_index['rooms_by_type'].get(course_info['RoomType'], [])
+    lecturers = resource_index['lecturers_by_course'].get(course_info['CourseNo'], [])
+
+    if _profiler is not None:
+        _profiler.count('resource_searches')
+        _profiler.count('room_checks', len(rooms))
+        _profiler.count('lecturer_checks', len(lecturers))
+
+    if isinstance(room_availability, AvailabilityTable) and isinstance(lecturer_availability, AvailabilityTable):
+        # One mask AND per candidate: the best-fitting free room and the best free lecturer
+        start_index = room_availability.slot_index[time_slot]
+        lecturer = lecturer_availability.choose(lecturers, start_index, length,
+                                                resource_index['lecturer_ranks'].get(course_info['CourseNo']), overload)
+        if lecturer is None:
+            return None, None
+        room = best_fit_room(room_availability, resource_index, course_info['RoomType'], section_size(course_info), start_index, length)
+        if room is None:
+            return None, None
+        return room, lecturer
+
+    for room in best_fit_order(resource_index, course_info['RoomType'], section_size(course_info)):
+        if room in room_availability and room_availability[room][time_slot]:
+            for lecturer in lecturers:
+                if lecturer in lecturer_availability and lecturer_availability[lecturer][time_slot]:
                     if check_availability_for_session_length(room, lecturer, room_availability, lecturer_availability, time_slot, length, time_slots):
                         return room, lecturer
     return None, None
 
-def is_time_slot_suitable(start_time_slot, session_length, time_slots):
+def is_time_slot_suitable(start_time_slot, session_length, time_slots, calendar=None):
     """
     Check if the time slot is suitable for the session length.
+
+    With a SlotCalendar this is a lookup in its precomputed table of valid start slots.
     """
+    if calendar is not None:
+        slot_id = calendar.slot_index.get(start_time_slot)
+        return slot_id is not None and calendar.is_valid_start(slot_id, session_length)
+
     # Extract the start day and time
     start_day, start_time = start_time_slot.split()
     start_hour, start_minute = map(int, start_time.split(':'))
@@ -256,20 +2097,28 @@ def is_time_slot_suitable(start_time_slot, session_length, time_slots):
         return True
     return False
 
-def is_restricted_time(day, start_hour, end_hour):
+def is_restricted_time(day, start_hour, end_hour, blackouts=None):
     """
     Check if the time slot falls into a restricted time.
     For example, Tuesday 10:00-12:00 is a common free slot.
     """
-    # Define restricted times (e.g., Tuesday 10:00-12:00)
-    if day == 'Tuesday' and ((start_hour <= 10 and end_hour > 10) or (start_hour < 12 and end_hour >= 12)):
-        return True
+    # Restricted times default to DEFAULT_BLACKOUTS (Tuesday 10:00-12:00)
+    if blackouts is None:
+        blackouts = DEFAULT_BLACKOUTS
+    for b_day, b_start, b_end in blackouts:
+        if day == b_day and start_hour < b_end and end_hour > b_start:
+            return True
     return False
 
 def check_availability_for_session_length(room, lecturer, room_availability, lecturer_availability, start_time_slot, session_length, time_slots):
     """
     Check if the room and lecturer are available for the entire session length.
     """
+    if isinstance(room_availability, AvailabilityTable) and isinstance(lecturer_availability, AvailabilityTable):
+        start_index = room_availability.slot_index[start_time_slot]
+        return room_availability.is_free(room, start_index, session_length) and \
+            lecturer_availability.is_free(lecturer, start_index, session_length)
+
     start_index = time_slots.index(start_time_slot)
     # Ensure the session doesn't overflow beyond available time slots
     if start_index + session_length - 1 >= len(time_slots):
@@ -386,90 +2235,162 @@ def check_availability_for_session_length(room, lecturer, room_availability, lec
 
 #     return sessions
 
-def schedule_course_sessions(course_info, room_availability, lecturer_availability, time_slots):
+def _iter_bits(mask):
+    # Set bit positions of mask, lowest first
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def release_availability(room_availability, lecturer_availability, room, lecturer, start_time_slot, session_length, time_slots):
+    """
+    Undo update_availability: mark the room and lecturer as free again for the session.
+    """
+    if isinstance(room_availability, AvailabilityTable) and isinstance(lecturer_availability, AvailabilityTable):
+        start_index = room_availability.slot_index[start_time_slot]
+        room_availability.release(room, start_index, session_length)
+        lecturer_availability.release(lecturer, start_index, session_length)
+        return
+
+    start_index = time_slots.index(start_time_slot)
+    for time_slot in time_slots[start_index:start_index + session_length]:
+        room_availability[room][time_slot] = True
+        lecturer_availability[lecturer][time_slot] = True
+
+def schedule_course_sessions(course_info, room_availability, lecturer_availability, time_slots, resource_index, calendar=None, occupancy=None,
+                             section=None):
     """
     Schedule each session of a course section based on its contact hours, 
     ensuring sessions do not overlap and follow preferred day distributions.
+
+    The day patterns come from calendar.day_patterns. Before a pattern is tried, the
+    start slots where some suitable room and some suitable lecturer are free are worked
+    out as bitmasks and intersected with each day's valid starts, so a pattern with a
+    session that cannot fit is rejected without booking anything. A pattern is only kept
+    if every session is placed; otherwise its bookings are undone and the next is tried.
+
+    With a ClashOccupancy, slots where the course would clash with more students than
+    its max_clash_weight are skipped, and placed sessions are recorded in it, under the
+    given section when the occupancy tracks sections.
     """
-    sessions = []
+    if calendar is None:
+        calendar = get_default_calendar()
+
+    course_no = course_info['CourseNo']
     contact_hours = course_info['ContactHours']
     session_lengths = [2] * (contact_hours // 2) + ([1] if contact_hours % 2 else [])
+    node = occupancy.node(course_no, section) if occupancy is not None else None
 
-    # Preferred session distributions
-    preferred_distributions = {
-        1: [('Sunday', ), ('Monday', ), ('Tuesday', ), ('Wednessday', ), ('Thursday', ) ],
-        2: [('Sunday', 'Tuesday'), ('Monday', 'Wednesday'), ('Monday', 'Thursday'), ('Tuesday', 'Thursday')],
-        3: [('Sunday', 'Tuesday', 'Thursday'), ('Monday', 'Wednesday', 'Thursday')]
-    }
-
-    # Get the preferred distribution for this course
-    preferred_days = preferred_distributions.get(len(session_lengths), [])
+    # Start slots with a free suitable room and a free suitable lecturer, per session length
+    use_masks = isinstance(room_availability, AvailabilityTable) and isinstance(lecturer_availability, AvailabilityTable)
+    feasible = {}
+    if use_masks:
+        rooms = resource_index['rooms_by_type'].get(course_info['RoomType'], [])
+        lecturers = resource_index['lecturers_by_course'].get(course_no, [])
+        for length in set(session_lengths):
+            feasible[length] = room_availability.free_starts(rooms, length) & lecturer_availability.free_starts(lecturers, length)
 
     # Iterate through preferred day distributions
-    for preferred_day_combo in preferred_days:
-        session_scheduled = [False] * len(session_lengths)
-        for i, length in enumerate(session_lengths):
-            for time_slot in time_slots:
-                day, _ = time_slot.split()
-                if day != preferred_day_combo[i]:
-                    continue  # Skip if not the preferred day for this session
+    for preferred_day_combo in calendar.day_patterns(len(session_lengths)):
+        if use_masks:
+            day_starts = [feasible[length] & calendar.valid_start_mask(length, day)
+                          for length, day in zip(session_lengths, preferred_day_combo)]
+            if not all(day_starts):
+                if _profiler is not None:
+                    _profiler.count('patterns_rejected')
+                continue
+        else:
+            day_starts = [calendar.valid_start_mask(length, day) for length, day in zip(session_lengths, preferred_day_combo)]
+
+        sessions = []
+        for length, starts in zip(session_lengths, day_starts):
+            for slot_id in _iter_bits(starts):
+                if _profiler is not None:
+                    _profiler.count('slot_probes')
+                if occupancy is not None and not occupancy.allows(node, slot_id, length):
+                    continue  # Skip slots where too many students would clash
+
+                time_slot = calendar.time_slots[slot_id]
+                room, lecturer = find_available_resources_for_session(course_info, room_availability, lecturer_availability, time_slot, length, time_slots, resource_index)
+                if room and lecturer:
+                    sessions.append({'time_slot': time_slot, 'room': room, 'lecturer': lecturer, 'length': length})
+                    update_availability(room_availability, lecturer_availability, room, lecturer, time_slot, length, time_slots)
+                    break  # Break after scheduling this session
+            else:
+                break  # This session has no start on its day; the pattern fails
+
+        # Keep the pattern only if all sessions are scheduled
+        if len(sessions) == len(session_lengths):
+            if occupancy is not None:
+                for session in sessions:
+                    occupancy.add(node, calendar.slot_index[session['time_slot']], session['length'])
+            return sessions
+        for session in sessions:
+            release_availability(room_availability, lecturer_availability, session['room'], session['lecturer'],
+                                 session['time_slot'], session['length'], time_slots)
 
-                if is_time_slot_suitable(time_slot, length, time_slots):
-                    room, lecturer = find_available_resources_for_session(course_info, room_availability, lecturer_availability, time_slot, length, time_slots)
-                    if room and lecturer:
-                        sessions.append({'time_slot': time_slot, 'room': room, 'lecturer': lecturer})
-                        update_availability(room_availability, lecturer_availability, room, lecturer, time_slot, length, time_slots)
-                        session_scheduled[i] = True
-                        break  # Break after scheduling this session
+    # If sessions could not be scheduled as per preferred days, return placeholders for manual intervention
+    if _profiler is not None:
+        _profiler.failed_placement(course_no)
+    return [{'time_slot': None, 'room': None, 'lecturer': None, 'length': length,
+             'reason': 'Suitable time slot not found on preferred day'} for length in session_lengths]
 
-        # Check if all sessions are scheduled successfully
-        if all(session_scheduled):
-            return sessions  # Return if all sessions are scheduled as per preferred distribution
 
-    # If sessions could not be scheduled as per preferred days, append placeholders for manual intervention
-    for i in range(len(session_lengths)):
-        if not session_scheduled[i]:
-            sessions.append({'time_slot': None, 'room': None, 'lecturer': None, 'reason': 'Suitable time slot not found on preferred day'})
 
-    return sessions
+def schedule_sections(sorted_cliques, df_course_details, df_rooms, df_lecturer_prefs, resource_index=None, calendar=None, occupancy=None):
+    # Walk the cliques in order, sorting the courses of each clique by the number of advised students (ascending order)
+    course_order = order_courses_by_cliques(sorted_cliques, df_course_details)
+    return schedule_courses(course_order, df_course_details, df_rooms, df_lecturer_prefs, resource_index, calendar, occupancy)
 
+def schedule_courses(course_order, df_course_details, df_rooms, df_lecturer_prefs, resource_index=None, calendar=None, occupancy=None):
+    """
+    Schedule every section of each course, in the given order.
 
+    Advised courses with no course details cannot be scheduled and are skipped.
 
-def schedule_sections(sorted_cliques, df_course_details, df_rooms, df_lecturer_prefs):
-    # Define time slots (excluding Tuesday 10:00-12:00)
-    time_slots = generate_time_slots()
+    Returns:
+    tuple: (AssignmentTable, room availability, lecturer availability, time slots, skipped courses)
+    """
+    # Define time slots (excluding Tuesday 10:00-12:00 by default)
+    if calendar is None:
+        calendar = get_default_calendar()
+    time_slots = calendar.time_slots
+
+    # Room and lecturer lookups are built once for the whole run
+    if resource_index is None:
+        resource_index = build_resource_index(df_rooms, df_lecturer_prefs)
 
     # Initialize timetable and other necessary structures
-    timetable = {}
+    timetable = AssignmentTable(calendar)
     room_availability = initialize_room_availability(df_rooms, time_slots)
     lecturer_availability = initialize_lecturer_availability(df_lecturer_prefs, time_slots)
 
-    # Iterate through each clique
-    for clique in sorted_cliques:
-        # Sort courses in the clique by the number of advised students (ascending order)
-        sorted_courses = sort_courses_in_clique(clique, df_course_details)
+    scheduled_courses = set()
+    skipped_courses = []
 
-        # Schedule each course
-        for course in sorted_courses:
+    # Schedule each course
+    for course in course_order:
 
-            print(course)
-            # Check if the course is already scheduled
-            if any(course == scheduled_course for scheduled_course, _ in timetable):
-                print(f"{course} Already scheduled")
-                continue
+        # Check if the course is already scheduled
+        if course in scheduled_courses:
+            continue
+        scheduled_courses.add(course)
 
-            # Fetch course details
-            course_info = df_course_details[df_course_details['CourseNo'] == course].iloc[0]
-            number_of_sections = course_info['NumberOfSections']
+        # Fetch course details; advised courses without any cannot be scheduled
+        course_rows = df_course_details[df_course_details['CourseNo'] == course]
+        if course_rows.empty:
+            skipped_courses.append(course)
+            continue
+        course_info = course_rows.iloc[0]
+        number_of_sections = course_info['NumberOfSections']
 
-            # Schedule each section of the course
-            for section in range(number_of_sections):
-                sessions = schedule_course_sessions(course_info, room_availability, lecturer_availability, time_slots)
-                timetable[(course, section)] = deepcopy(sessions)
-            # break
-        # break
+        # Schedule each section of the course
+        for section in range(number_of_sections):
+            sessions = schedule_course_sessions(course_info, room_availability, lecturer_availability, time_slots, resource_index, calendar, occupancy,
+                                                section)
+            timetable.add_section(course, section, sessions)
 
-    return timetable, room_availability, lecturer_availability, time_slots
+    return timetable, room_availability, lecturer_availability, time_slots, skipped_courses
 
 # def schedule_sections(sorted_cliques, df_course_details, df_rooms, df_lecturer_prefs):
 #     # Define time slots (excluding Tuesday 10:00-12:00)
@@ -505,32 +2426,242 @@ def schedule_sections(sorted_cliques, df_course_details, df_rooms, df_lecturer_p
 #     return timetable, room_availability, lecturer_availability, time_slots
 
 
+# Reason left on sessions the repair pass could not place
+REPAIR_FAILED_REASON = 'No free slot, room and lecturer on any day, next to the section or by ejecting a smaller course'
+
+# Relaxations tried by repair_unscheduled_sessions, cheapest first
+REPAIR_RELAXATIONS = ['any-day', 'adjacent', 'ejection', 'overload']
+
+def repair_unscheduled_sessions(assignments, df_course_details, room_availability, lecturer_availability, resource_index,
+                                calendar=None, occupancy=None, max_ejections=20):
+    """
+    Place the placeholder sessions of a timetable, trying cheaper relaxations first.
+
+    The unscheduled rows are the work queue, largest courses first, so the work grows with
+    the number of failures instead of the size of the catalogue. Each session is tried with:
+
+    1. 'any-day': any valid start on a day its section does not use yet;
+    2. 'adjacent': a start right before or after another session of its section;
+    3. 'ejection': taking the room and lecturer of one session of a course with fewer
+       advised students, which must then be re-placed by 1 or 2, or the move is undone;
+    4. 'overload': as 1, but taking a lecturer past MaxLoad even though another lecturer
+       of the course still has load left (see LecturerAvailability.choose).
+
+    Within a relaxation the start with the fewest clashing students wins. Only the rooms,
+    lecturers and slots of the sessions that move are updated.
+
+    Args:
+    assignments (AssignmentTable): The timetable, updated in place.
+    room_availability (AvailabilityTable): Room availability matching the timetable.
+    lecturer_availability (AvailabilityTable): Lecturer availability matching the timetable.
+    resource_index (dict): Lookups from build_resource_index over the same rooms and lecturers.
+    occupancy (ClashOccupancy): Optional clash index; its max_clash_weight is respected.
+    max_ejections (int): Most ejection moves tried per session.
+
+    Returns:
+    dict: Sessions queued, sessions placed by each relaxation, and sessions still unscheduled.
+    """
+    if calendar is None:
+        calendar = get_default_calendar()
+
+    time_slots = calendar.time_slots
+    slot_day, slot_hour = calendar.day.tolist(), calendar.hour.tolist()
+    course_infos = df_course_details.drop_duplicates('CourseNo').set_index('CourseNo', drop=False).to_dict('index')
+    priority = {course: info['NumberOfAdvisedStudents'] for course, info in course_infos.items()}
+    lecturers_by_course = resource_index['lecturers_by_course']
+
+    def clash_node(row):
+        return occupancy.node(assignments.course_of(row), assignments.section_of(row)) if occupancy is not None else None
+
+    def clash_weight(node, slot_id, length):
+        return occupancy.weight(node, slot_id, length) if occupancy is not None else 0
+
+    def sibling_spans(row):
+        # (start, length) of the other placed sessions of the row's section
+        spans = []
+        for other in assignments.rows_for_section(assignments.course_of(row), assignments.section_of(row)):
+            if other != row and assignments.slot_of(other) is not None:
+                spans.append((assignments.slot_of(other), assignments.length_of(other)))
+        return spans
+
+    def candidate_starts(row, relaxation):
+        length = assignments.length_of(row)
+        spans = sibling_spans(row)
+        if relaxation in ('any-day', 'overload'):
+            used_days = {slot_day[start] for start, _ in spans}
+            return [s for s in calendar.valid_starts(length) if slot_day[s] not in used_days]
+        # Back to back with a session of the section, on its day, without overlapping any other
+        starts = set()
+        for start, other_length in spans:
+            before, after = start - length, start + other_length
+            if calendar.is_valid_start(before, length) and slot_day[before] == slot_day[start] \
+                    and slot_hour[before] + length == slot_hour[start]:
+                starts.add(before)
+            if calendar.is_valid_start(after, length) and slot_day[after] == slot_day[start] \
+                    and slot_hour[start] + other_length == slot_hour[after]:
+                starts.add(after)
+        return sorted(s for s in starts if all(s + length <= o or o + o_length <= s for o, o_length in spans))
+
+    def place(row, slot_id, room, lecturer):
+        length = assignments.length_of(row)
+        room_availability.book(room, slot_id, length)
+        lecturer_availability.book(lecturer, slot_id, length)
+        if occupancy is not None:
+            occupancy.add(clash_node(row), slot_id, length)
+        assignments.set_session(row, slot_id, room, lecturer)
+
+    def unplace(row):
+        slot_id, length = assignments.slot_of(row), assignments.length_of(row)
+        room, lecturer = assignments.room_of(row), assignments.lecturer_of(row)
+        if room in room_availability:
+            room_availability.release(room, slot_id, length)
+        if lecturer in lecturer_availability:
+            lecturer_availability.release(lecturer, slot_id, length)
+        if occupancy is not None:
+            occupancy.remove(clash_node(row), slot_id, length)
+        assignments.set_session(row, None, None, None)
+        return slot_id, room, lecturer
+
+    def try_place(row, relaxation):
+        course, length = assignments.course_of(row), assignments.length_of(row)
+        course_info = course_infos.get(course)
+        if course_info is None:
+            return False
+        node = clash_node(row)
+        best = None
+        for slot_id in candidate_starts(row, relaxation):
+            if occupancy is not None and not occupancy.allows(node, slot_id, length):
+                continue
+            room, lecturer = find_available_resources_for_session(course_info, room_availability, lecturer_availability,
+                                                                  time_slots[slot_id], length, time_slots, resource_index,
+                                                                  relaxation == 'overload')
+            if room and lecturer:
+                candidate = (clash_weight(node, slot_id, length), slot_id, room, lecturer)
+                if best is None or candidate[:2] < best[:2]:
+                    best = candidate
+        if best is None:
+            return False
+        place(row, *best[1:])
+        return True
+
+    def try_eject(row):
+        course, length = assignments.course_of(row), assignments.length_of(row)
+        course_info = course_infos.get(course)
+        if course_info is None:
+            return False
+        rooms = list(best_fit_order(resource_index, course_info['RoomType'], section_size(course_info)))
+        lecturers = lecturers_by_course.get(course, [])
+        if isinstance(lecturer_availability, LecturerAvailability):
+            # Lecturers the session would take past MaxLoad only while none has load left
+            lecturers = [lecturer for lecturer in lecturers if lecturer_availability.remaining(lecturer) >= length] or lecturers
+
+        room_set = set(rooms)
+
+        def ejectable(victim):
+            victim_course = assignments.course_of(victim)
+            return victim_course != course and priority.get(victim_course, 0) < priority.get(course, 0)
+
+        # Starts where exactly one session of a smaller course holds the room and/or lecturer needed
+        node = clash_node(row)
+        moves = []
+        for slot_id in candidate_starts(row, 'any-day'):
+            if occupancy is not None and not occupancy.allows(node, slot_id, length):
+                continue
+            weight = clash_weight(node, slot_id, length)
+            covering = set().union(*(assignments.rows_at_slot(i) for i in range(slot_id, slot_id + length)))
+            slot_moves = []
+            for lecturer in lecturers:
+                lecturer_blockers = list(assignments.rows_for_lecturer(lecturer) & covering)
+                if not lecturer_blockers:
+                    # Free lecturer: eject the one session in a room of the right type
+                    for room in rooms:
+                        if len(slot_moves) >= max_ejections:
+                            break
+                        room_blockers = list(assignments.rows_for_room(room) & covering)
+                        if len(room_blockers) == 1 and ejectable(room_blockers[0]):
+                            slot_moves.append((room, lecturer, room_blockers[0]))
+                elif len(lecturer_blockers) == 1 and ejectable(lecturer_blockers[0]):
+                    # Busy lecturer: eject their session and use a free room or the one it frees
+                    victim = lecturer_blockers[0]
+                    candidate_rooms = room_availability.free_resources(rooms, slot_id, length)[:1]
+                    victim_room = assignments.room_of(victim)
+                    if victim_room in room_set and assignments.rows_for_room(victim_room) & covering == {victim}:
+                        candidate_rooms.append(victim_room)
+                    slot_moves.extend((room, lecturer, victim) for room in candidate_rooms)
+            moves.extend((weight, slot_id, room, lecturer, victim) for room, lecturer, victim in slot_moves)
+        moves.sort(key=lambda move: move[:2])
+
+        for _, slot_id, room, lecturer, victim in moves[:max_ejections]:
+            victim_slot, victim_room, victim_lecturer = unplace(victim)
+            if room_availability.is_free(room, slot_id, length) and lecturer_availability.is_free(lecturer, slot_id, length):
+                place(row, slot_id, room, lecturer)
+                if try_place(victim, 'any-day') or try_place(victim, 'adjacent'):
+                    return True
+                unplace(row)
+            place(victim, victim_slot, victim_room, victim_lecturer)
+        return False
+
+    def section_is_complete(row):
+        course_info = course_infos.get(assignments.course_of(row))
+        rows = assignments.rows_for_section(assignments.course_of(row), assignments.section_of(row))
+        placed = sum(assignments.slot_of(other) is not None for other in rows)
+        return course_info is not None and placed >= course_info['NumberofSessions']
+
+    queue = sorted(assignments.unscheduled_rows().tolist(), key=lambda row: -priority.get(assignments.course_of(row), 0))
+    stats = {'queued': len(queue), **{relaxation: 0 for relaxation in REPAIR_RELAXATIONS}, 'unscheduled': 0}
+    for row in queue:
+        placed_by = None
+        # A placeholder in a section that already has all its sessions is left alone
+        if assignments.length_of(row) > 0 and not section_is_complete(row):
+            for relaxation in REPAIR_RELAXATIONS:
+                if try_place(row, relaxation) if relaxation != 'ejection' else try_eject(row):
+                    placed_by = relaxation
+                    break
+        if placed_by is None:
+            assignments.reasons[row] = REPAIR_FAILED_REASON
+            stats['unscheduled'] += 1
+        else:
+            stats[placed_by] += 1
+        if _profiler is not None:
+            _profiler.count(f"repair_{placed_by or 'failed'}")
+    return stats
+
+
 # Step 5: Handling Unscheduled Courses and Sections
-def handle_unscheduled_courses_and_sessions(timetable, df_course_details, room_availability, lecturer_availability, time_slots):
+def handle_unscheduled_courses_and_sessions(timetable, df_course_details, room_availability, lecturer_availability, time_slots, resource_index, calendar=None, occupancy=None):
     """
     Schedule any remaining unscheduled courses and their sessions.
-    """
-    for index, course_info in df_course_details.iterrows():
-        course_no = course_info['CourseNo']
-        number_of_sections = course_info['NumberOfSections']
-        number_of_sessions = course_info['NumberofSessions']
 
-        for section in range(number_of_sections):
-            # Check if this section of the course is already fully scheduled
-            if (course_no, section) not in timetable or len([s for s in timetable[(course_no, section)] if s['time_slot'] is not None]) < number_of_sessions:
-                # Schedule remaining sessions for this section
-                remaining_sessions = schedule_course_sessions(course_info, room_availability, lecturer_availability, time_slots)
-                if (course_no, section) in timetable:
-                    # Replace any placeholder sessions with actual scheduled sessions
-                    for i, session in enumerate(timetable[(course_no, section)]):
-                        if session['time_slot'] is None and remaining_sessions:
-                            timetable[(course_no, section)][i] = remaining_sessions.pop(0)
-                    # Append any additional remaining sessions
-                    timetable[(course_no, section)].extend(remaining_sessions)
-                else:
-                    timetable[(course_no, section)] = remaining_sessions
+    Sections the greedy pass never reached, such as courses outside the clash graph, are
+    scheduled with schedule_course_sessions; placeholder sessions are then placed by
+    repair_unscheduled_sessions. The timetable may be an AssignmentTable, which is updated
+    in place, or a (course, section) -> sessions dict, for which an updated dict is returned.
 
-    return timetable
+    Returns:
+    tuple: (timetable, repair statistics from repair_unscheduled_sessions)
+    """
+    if calendar is None:
+        calendar = get_default_calendar()
+    assignments = as_assignment_table(timetable, calendar)
+
+    # Sections in the course details with no sessions in the timetable at all
+    expected = expected_sections(df_course_details)
+    present = set(assignments.sections())
+    course_details = None
+    for course_no, section in zip(expected['CourseNo'], expected['Section'].tolist()):
+        if (course_no, section) in present:
+            continue
+        if course_details is None:
+            course_details = df_course_details.drop_duplicates('CourseNo').set_index('CourseNo', drop=False)
+        sessions = schedule_course_sessions(course_details.loc[course_no], room_availability, lecturer_availability, time_slots, resource_index, calendar, occupancy,
+                                            section)
+        assignments.add_section(course_no, section, sessions)
+
+    # Work only on the sessions that failed
+    stats = repair_unscheduled_sessions(assignments, df_course_details, room_availability, lecturer_availability,
+                                        resource_index, calendar, occupancy)
+
+    return _same_shape(timetable, assignments), stats
 
 # def handle_unscheduled_courses_and_sessions(timetable, df_course_details, room_availability, lecturer_availability, time_slots):
 #     """
@@ -573,206 +2704,978 @@ def handle_unscheduled_courses_and_sessions(timetable, df_course_details, room_a
 #     return timetable
 
 
-# Step 6: Final Adjustments and Validation
-def final_adjustments_and_validation(timetable, df_course_details, df_rooms, df_lecturer_prefs, time_slots):
-    """
-    Make final adjustments to the timetable and validate it, considering the sessions.
+# Multi-start search: run the greedy from several clique orderings and keep the best timetable
+def count_student_clashes(timetable, G, calendar):
     """
-    # Check for any conflicts or unmet constraints
-    conflicts = check_for_conflicts_with_sessions(timetable, df_course_details, df_rooms, df_lecturer_prefs, time_slots)
-
-    # If there are conflicts, attempt to resolve them
-    if conflicts:
-        resolve_conflicts_with_sessions(timetable, conflicts, df_course_details, df_rooms, df_lecturer_prefs, time_slots)
+    Count the students sitting in two courses at the same time, summed over every hour.
 
-    # Validate that all courses and sessions have been scheduled
-    validation_success = validate_complete_scheduling_with_sessions(timetable, df_course_details)
+    On a section-level clash graph only the students of the sections involved count.
+    """
+    assignments = as_assignment_table(timetable, calendar)
+    occupancy = ClashOccupancy(G, len(calendar.time_slots))
+    clashes = 0
+    courses = assignments.courses
+    for course_id, section, slot_id, length in zip(assignments.column('course_id').tolist(), assignments.column('section').tolist(),
+                                                   assignments.column('slot_id').tolist(), assignments.column('length').tolist()):
+        if slot_id < 0:
+            continue
+        node = occupancy.node(courses[course_id], section)
+        clashes += occupancy.weight(node, slot_id, length)
+        occupancy.add(node, slot_id, length)
+    return clashes
+
+def score_timetable(timetable, G, calendar, resource_index):
+    """
+    Score a timetable; lower is better.
 
-    return timetable, validation_success
+    Returns:
+    tuple: (unscheduled sessions, student clashes, preference cost), compared in that order.
+           The preference cost adds 0 for a Pref1 lecturer up to 4 for Pref5.
+    """
+    assignments = as_assignment_table(timetable, calendar)
+    preference_rank = resource_index['preference_rank']
+    courses, lecturers = assignments.courses, assignments.lecturers
+    unscheduled = len(assignments.unscheduled_rows())
+    preference_cost = 0
+    for course_id, slot_id, lecturer_id in zip(assignments.column('course_id').tolist(), assignments.column('slot_id').tolist(),
+                                               assignments.column('lecturer_id').tolist()):
+        if slot_id >= 0:
+            lecturer = lecturers[lecturer_id] if lecturer_id >= 0 else None
+            preference_cost += preference_rank.get((lecturer, courses[course_id]), 5) - 1
+    return unscheduled, count_student_clashes(assignments, G, calendar), preference_cost
+
+def perturb_clique_order(sorted_cliques, df_course_details, start, seed=0):
+    """
+    Return the clique order for one start of the multi-start search.
 
-def check_for_conflicts_with_sessions(timetable, df_course_details, df_rooms, df_lecturer_prefs, time_slots):
+    Start 0 sorts by total enrollment and start 1 by size. Later starts alternate
+    between the two with random noise on the sort key, seeded by `seed + start`.
     """
-    Check the timetable for any scheduling conflicts or unmet constraints, considering sessions.
+    if start == 0:
+        return sort_cliques_by_total_enrollment(sorted_cliques, df_course_details)
+    if start == 1:
+        return sort_cliques_by_size(list(sorted_cliques))
+
+    rng = random.Random(seed + start)
+    if start % 2 == 0:
+        advised_students_map = df_course_details.set_index('CourseNo')['NumberOfAdvisedStudents'].to_dict()
+        keys = [sum(advised_students_map.get(course, 0) for course in clique) * rng.uniform(0.8, 1.2)
+                for clique in sorted_cliques]
+    else:
+        keys = [len(clique) + rng.random() for clique in sorted_cliques]
+    order = sorted(range(len(sorted_cliques)), key=lambda i: keys[i], reverse=True)
+    return [sorted_cliques[i] for i in order]
+
+def perturb_course_order(course_order, start, seed=0):
     """
-    conflicts = []
-    # Check for overlapping sessions
-    for (course, section), sessions in timetable.items():
-        for session in sessions:
-            time_slot = session['time_slot']
-            room = session['room']
-            lecturer = session['lecturer']
+    Return the course order for one start of the multi-start search over a DSATUR or
+    weighted-degree ordering.
 
-            # Check for room and lecturer availability conflicts
-            if not is_room_available_for_session(room, df_rooms, time_slot) or \
-               not is_lecturer_available_for_session(lecturer, df_lecturer_prefs, time_slot):
-                conflicts.append({'course': course, 'section': section, 'time_slot': time_slot, 'room': room, 'lecturer': lecturer})
+    Start 0 keeps the order. Later starts scale each course's position by random noise
+    in [0.8, 1.2], seeded by `seed + start`, so courses near the front move least.
+    """
+    if start == 0:
+        return list(course_order)
 
-    return conflicts
+    rng = random.Random(seed + start)
+    keys = [position * rng.uniform(0.8, 1.2) for position in range(len(course_order))]
+    order = sorted(range(len(course_order)), key=lambda i: keys[i])
+    return [course_order[i] for i in order]
 
-def is_room_available_for_session(room, df_rooms, time_slot):
+def run_greedy(sorted_cliques, df_course_details, df_rooms, df_lecturer_prefs, resource_index, calendar, G, max_clash=None):
     """
-    Check if the room is available for the given time slot.
+    Run the greedy scheduler and the unscheduled-session pass once for a clique order.
     """
-    # Assuming df_rooms has a column 'AvailableTimeSlots' which is a list of available time slots for each room
-    room_data = df_rooms[df_rooms['RoomNo'] == room]
+    course_order = order_courses_by_cliques(sorted_cliques, df_course_details)
+    return run_greedy_order(course_order, df_course_details, df_rooms, df_lecturer_prefs, resource_index, calendar, G, max_clash)
 
-    if room_data.empty:
-        # Room not found
-        return False
+def run_greedy_order(course_order, df_course_details, df_rooms, df_lecturer_prefs, resource_index, calendar, G, max_clash=None):
+    """
+    Run the greedy scheduler and the unscheduled-session pass once for a course order.
+    """
+    occupancy = ClashOccupancy(G, len(calendar.time_slots), max_clash)
+    timetable, room_availability, lecturer_availability, time_slots, _ = schedule_courses(
+        course_order, df_course_details, df_rooms, df_lecturer_prefs, resource_index, calendar, occupancy)
+    timetable, _ = handle_unscheduled_courses_and_sessions(
+        timetable, df_course_details, room_availability, lecturer_availability, time_slots, resource_index, calendar, occupancy)
+    return timetable
 
-    # Check if the time slot is in the room's list of available time slots
-    available_time_slots = room_data.iloc[0]['AvailableTimeSlots']
-    return time_slot in available_time_slots
+# Read-only inputs for multi-start workers, set once per process by _init_multistart_worker
+_multistart_state = None
 
+def _init_multistart_worker(state):
+    global _multistart_state
+    _multistart_state = state
 
-def is_lecturer_available_for_session(lecturer, df_lecturer_prefs, time_slot):
+def _run_multistart(start):
+    state = _multistart_state
+    if state['course_order'] is not None:
+        course_order = perturb_course_order(state['course_order'], start, state['seed'])
+    else:
+        sorted_cliques = perturb_clique_order(state['cliques'], state['df_course_details'], start, state['seed'])
+        course_order = order_courses_by_cliques(sorted_cliques, state['df_course_details'])
+    timetable = run_greedy_order(course_order, state['df_course_details'], state['df_rooms'], state['df_lecturer_prefs'],
+                                 state['resource_index'], state['calendar'], state['graph'], state['max_clash'])
+    score = score_timetable(timetable, state['graph'], state['calendar'], state['resource_index'])
+    return score, start, timetable
+
+def multistart_schedule(cliques, G, df_course_details, df_rooms, df_lecturer_prefs, resource_index, calendar,
+                        n_starts, workers=None, seed=0, max_clash=None, course_order=None):
     """
-    Check if the lecturer is available for the given time slot.
+    Run n_starts greedy schedules from different clique orderings in a process pool and keep the best.
+
+    With a course_order (from the DSATUR or weighted-degree ordering), each start perturbs
+    that order with perturb_course_order instead and cliques is not used.
+
+    The clash graph, cliques and resource index are handed to each worker once through
+    the pool initializer, not pickled again for every start.
+
+    Returns:
+    tuple: (best timetable, its score, the start that produced it)
     """
-    # Assuming df_lecturer_prefs has a column 'AvailableTimeSlots' which is a list of available time slots for each lecturer
-    lecturer_data = df_lecturer_prefs[df_lecturer_prefs['FacultyID'] == lecturer]
+    state = {'cliques': cliques, 'graph': G, 'df_course_details': df_course_details, 'df_rooms': df_rooms,
+             'df_lecturer_prefs': df_lecturer_prefs, 'resource_index': resource_index, 'calendar': calendar,
+             'seed': seed, 'max_clash': max_clash, 'course_order': course_order}
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, n_starts))
+
+    if workers == 1:
+        _init_multistart_worker(state)
+        results = map(_run_multistart, range(n_starts))
+        best = min(results, key=lambda result: (result[0], result[1]))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_multistart_worker, initargs=(state,)) as executor:
+            best = min(executor.map(_run_multistart, range(n_starts)), key=lambda result: (result[0], result[1]))
 
-    if lecturer_data.empty:
-        # Lecturer not found
-        return False
+    score, start, timetable = best
+    return timetable, score, start
+
+
+# Step 6: Final Adjustments and Validation
 
-    # Check if the time slot is in the lecturer's list of available time slots
-    available_time_slots = lecturer_data.iloc[0]['AvailableTimeSlots']
-    return time_slot in available_time_slots
+# Cost of leaving a session unscheduled, in clashing student-hours
+UNSCHEDULED_PENALTY = 1000
 
+def build_availability_from_timetable(timetable, df_rooms, df_lecturer_prefs, calendar):
+    """
+    Rebuild room and lecturer AvailabilityTables from the sessions placed in a timetable.
+    """
+    assignments = as_assignment_table(timetable, calendar)
+    room_availability = initialize_room_availability(df_rooms, calendar.time_slots)
+    lecturer_availability = initialize_lecturer_availability(df_lecturer_prefs, calendar.time_slots)
+    for row in range(len(assignments)):
+        slot_id = assignments.slot_of(row)
+        if slot_id is None:
+            continue
+        length = assignments.length_of(row)
+        room, lecturer = assignments.room_of(row), assignments.lecturer_of(row)
+        if room in room_availability:
+            room_availability.book(room, slot_id, length)
+        if lecturer in lecturer_availability:
+            lecturer_availability.book(lecturer, slot_id, length)
+    return room_availability, lecturer_availability
+
+def lecturer_load_report(timetable, df_rooms, df_lecturer_prefs, calendar=None):
+    """
+    Return each lecturer's MaxLoad, booked contact hours and remaining hours in a timetable.
 
-def resolve_conflicts_with_sessions(timetable, conflicts, df_course_details, df_rooms, df_lecturer_prefs, time_slots):
+    See LecturerAvailability.load_report; Remaining is negative for lecturers over MaxLoad.
     """
-    Attempt to resolve any identified conflicts, considering sessions.
+    if calendar is None:
+        calendar = get_default_calendar()
+    _, lecturer_availability = build_availability_from_timetable(timetable, df_rooms, df_lecturer_prefs, calendar)
+    return lecturer_availability.load_report()
+
+def improve_timetable(timetable, G, df_course_details, df_rooms, df_lecturer_prefs, resource_index=None, calendar=None,
+                      time_budget=5.0, max_iterations=None, seed=0, initial_temperature=10.0):
     """
-    for conflict in conflicts:
-        # Extract conflict details
-        course_no, section, session = conflict['course'], conflict['section'], conflict['session']
+    Improve a timetable with simulated annealing over its sessions.
 
-        # Retrieve course and session info
-        course_info = df_course_details[df_course_details['CourseNo'] == course_no].iloc[0]
-        session_length = get_session_length(session, course_info)
+    Three neighbourhoods are tried: move a session to another start slot (keeping its room
+    and lecturer when they are free), swap the slots and rooms of two sessions of the same
+    length and room type, and insert an unscheduled session into a free slot. Sessions of
+    one section stay on different days, and a move or swap only gives a session a room that
+    seats its section or at least as many students as its current room. The cost is UNSCHEDULED_PENALTY per unscheduled
+    session plus student clashes plus preference cost, and each candidate is scored from
+    ClashOccupancy lookups, without re-validating the timetable.
 
-        # Attempt to find alternative resources
-        new_time_slot, new_room, new_lecturer = find_alternative_resources(course_info, df_rooms, df_lecturer_prefs, time_slots, session_length)
+    Args:
+    timetable (AssignmentTable): As built by schedule_sections; updated in place. A (course, section)
+        -> list of session dicts is also accepted, and an improved dict is returned for it.
+    G (Graph): The weighted clash graph.
+    time_budget (float): Seconds to search for.
+    max_iterations (int): Optional cap on the number of candidate moves.
+    seed (int): Random seed.
+    initial_temperature (float): Starting annealing temperature, in cost units.
 
-        if new_time_slot and new_room and new_lecturer:
-            # Update the timetable with the new resources for the session
-            update_timetable(timetable, course_no, section, session, new_time_slot, new_room, new_lecturer)
+    Returns:
+    tuple: (timetable, stats dict with iterations, accepted moves and initial/final cost)
+    """
+    if resource_index is None:
+        resource_index = build_resource_index(df_rooms, df_lecturer_prefs)
+    if calendar is None:
+        calendar = get_default_calendar()
+
+    rng = random.Random(seed)
+    course_room_type = df_course_details.set_index('CourseNo')['RoomType'].to_dict()
+    course_size = {course: section_size(info) for course, info in df_course_details.set_index('CourseNo').to_dict('index').items()}
+    lecturers_by_course = resource_index['lecturers_by_course']
+    lecturer_ranks = resource_index['lecturer_ranks']
+    preference_rank = resource_index['preference_rank']
+    slot_day = calendar.day.tolist()
+
+    def preference_cost(lecturer, course):
+        return preference_rank.get((lecturer, course), 5) - 1
+
+    room_capacity = resource_index['room_capacity']
+
+    def seats(room, course, current_room):
+        # A session may only change to a room that seats its section, or at least as many as its current room
+        capacity = room_capacity.get(room, 0)
+        return capacity >= course_size.get(course, 0) or capacity >= room_capacity.get(current_room, 0)
+
+    assignments = as_assignment_table(timetable, calendar)
+    room_availability, lecturer_availability = build_availability_from_timetable(assignments, df_rooms, df_lecturer_prefs, calendar)
+    occupancy = ClashOccupancy(G, len(calendar.time_slots))
+
+    # Placed sessions as [course, section key, row, slot id], plus the unscheduled ones
+    placed, unplaced = [], []
+    section_sessions = {}
+    cost = 0
+    for key in assignments.sections():
+        course = key[0]
+        for row in assignments.rows_for_section(*key):
+            slot_id = assignments.slot_of(row)
+            if slot_id is None:
+                unplaced.append([course, key, row])
+                cost += UNSCHEDULED_PENALTY
+                continue
+            length = assignments.length_of(row)
+            node = occupancy.node(*key)
+            cost += occupancy.weight(node, slot_id, length) + preference_cost(assignments.lecturer_of(row), course)
+            occupancy.add(node, slot_id, length)
+            entry = [course, key, row, slot_id]
+            placed.append(entry)
+            section_sessions.setdefault(key, []).append(entry)
+
+    # Sessions that can swap with each other share a length and a room type
+    swap_groups = {}
+    for entry in placed:
+        group = (assignments.length_of(entry[2]), course_room_type.get(entry[0]))
+        swap_groups.setdefault(group, []).append(entry)
+
+    def day_is_free(key, day, *excluded):
+        return all(slot_day[other[3]] != day for other in section_sessions.get(key, []) if other not in excluded)
+
+    def try_move(entry, temperature):
+        course, key, row, old_slot = entry
+        node = occupancy.node(*key)
+        length = assignments.length_of(row)
+        new_slot = rng.choice(calendar.valid_starts(length) or (old_slot,))
+        if new_slot == old_slot or not day_is_free(key, slot_day[new_slot], entry):
+            return 0, False
+
+        old_room, old_lecturer = assignments.room_of(row), assignments.lecturer_of(row)
+        room_availability.release(old_room, old_slot, length)
+        lecturer_availability.release(old_lecturer, old_slot, length)
+
+        room = old_room if room_availability.is_free(old_room, new_slot, length) else \
+            best_fit_room(room_availability, resource_index, course_room_type.get(course), course_size.get(course, 0), new_slot, length)
+        if room is not None and not seats(room, course, old_room):
+            room = None
+        lecturer = old_lecturer if lecturer_availability.is_free(old_lecturer, new_slot, length) else \
+            lecturer_availability.choose(lecturers_by_course.get(course, []), new_slot, length, lecturer_ranks.get(course))
+
+        delta = None
+        if room is not None and lecturer is not None:
+            delta = occupancy.weight(node, new_slot, length) - occupancy.weight(node, old_slot, length) + \
+                preference_cost(lecturer, course) - preference_cost(old_lecturer, course)
+
+        if delta is None or not accept(delta, temperature):
+            room_availability.book(old_room, old_slot, length)
+            lecturer_availability.book(old_lecturer, old_slot, length)
+            return 0, False
+
+        room_availability.book(room, new_slot, length)
+        lecturer_availability.book(lecturer, new_slot, length)
+        occupancy.remove(node, old_slot, length)
+        occupancy.add(node, new_slot, length)
+        assignments.set_session(row, new_slot, room, lecturer)
+        entry[3] = new_slot
+        return delta, True
+
+    def try_swap(entry, temperature):
+        course, key, row_a, slot_a = entry
+        length = assignments.length_of(row_a)
+        group = swap_groups[(length, course_room_type.get(course))]
+        other = group[rng.randrange(len(group))]
+        other_course, other_key, row_b, slot_b = other
+        if other_course == course or other_key == key:
+            return 0, False
+        # Overlapping sessions cannot trade places
+        if slot_day[slot_a] == slot_day[slot_b] and abs(slot_a - slot_b) < length:
+            return 0, False
+        if not day_is_free(key, slot_day[slot_b], entry) or not day_is_free(other_key, slot_day[slot_a], other):
+            return 0, False
+        # The sessions trade rooms too, so each room must seat the other section
+        room_a, room_b = assignments.room_of(row_a), assignments.room_of(row_b)
+        if not seats(room_b, course, room_a) or not seats(room_a, other_course, room_b):
+            return 0, False
+
+        lecturer_a, lecturer_b = assignments.lecturer_of(row_a), assignments.lecturer_of(row_b)
+        lecturer_availability.release(lecturer_a, slot_a, length)
+        lecturer_availability.release(lecturer_b, slot_b, length)
+        if not (lecturer_availability.is_free(lecturer_a, slot_b, length) and lecturer_availability.is_free(lecturer_b, slot_a, length)):
+            lecturer_availability.book(lecturer_a, slot_a, length)
+            lecturer_availability.book(lecturer_b, slot_b, length)
+            return 0, False
+
+        # Each session loses the other's clash weight in the slot it moves into
+        node_a, node_b = occupancy.node(*key), occupancy.node(*other_key)
+        mutual = G[node_a][node_b]['weight'] * length if G.has_edge(node_a, node_b) else 0
+        delta = occupancy.weight(node_a, slot_b, length) + occupancy.weight(node_b, slot_a, length) - 2 * mutual - \
+            occupancy.weight(node_a, slot_a, length) - occupancy.weight(node_b, slot_b, length)
+
+        if not accept(delta, temperature):
+            lecturer_availability.book(lecturer_a, slot_a, length)
+            lecturer_availability.book(lecturer_b, slot_b, length)
+            return 0, False
+
+        lecturer_availability.book(lecturer_a, slot_b, length)
+        lecturer_availability.book(lecturer_b, slot_a, length)
+        occupancy.remove(node_a, slot_a, length)
+        occupancy.remove(node_b, slot_b, length)
+        occupancy.add(node_a, slot_b, length)
+        occupancy.add(node_b, slot_a, length)
+        assignments.set_session(row_a, slot_b, room_b, lecturer_a)
+        assignments.set_session(row_b, slot_a, room_a, lecturer_b)
+        entry[3], other[3] = slot_b, slot_a
+        return delta, True
+
+    def try_insert(index, temperature):
+        course, key, row = unplaced[index]
+        length = assignments.length_of(row)
+        starts = calendar.valid_starts(length)
+        if not starts:
+            return 0, False
+        new_slot = rng.choice(starts)
+        if not day_is_free(key, slot_day[new_slot]):
+            return 0, False
+        room = best_fit_room(room_availability, resource_index, course_room_type.get(course), course_size.get(course, 0), new_slot, length)
+        lecturer = lecturer_availability.choose(lecturers_by_course.get(course, []), new_slot, length, lecturer_ranks.get(course))
+        if room is None or lecturer is None:
+            return 0, False
+
+        node = occupancy.node(*key)
+        delta = occupancy.weight(node, new_slot, length) + preference_cost(lecturer, course) - UNSCHEDULED_PENALTY
+        if not accept(delta, temperature):
+            return 0, False
+
+        room_availability.book(room, new_slot, length)
+        lecturer_availability.book(lecturer, new_slot, length)
+        occupancy.add(node, new_slot, length)
+        assignments.set_session(row, new_slot, room, lecturer)
+        entry = [course, key, row, new_slot]
+        placed.append(entry)
+        section_sessions.setdefault(key, []).append(entry)
+        swap_groups.setdefault((length, course_room_type.get(course)), []).append(entry)
+        unplaced[index] = unplaced[-1]
+        unplaced.pop()
+        return delta, True
+
+    def accept(delta, temperature):
+        return delta <= 0 or (temperature > 0 and rng.random() < math.exp(-delta / temperature))
+
+    stats = {'iterations': 0, 'accepted': 0, 'initial_cost': cost}
+    start_time = time.perf_counter()
+    progress = 0.0
+    while placed or unplaced:
+        if max_iterations is not None and stats['iterations'] >= max_iterations:
+            break
+        if stats['iterations'] % 64 == 0:
+            elapsed = time.perf_counter() - start_time
+            if elapsed >= time_budget:
+                break
+            progress = elapsed / time_budget if time_budget > 0 else 1.0
+            if max_iterations:
+                progress = max(progress, stats['iterations'] / max_iterations)
+        temperature = initial_temperature * (1.0 - progress)
+        stats['iterations'] += 1
+
+        roll = rng.random()
+        if unplaced and (roll < 0.2 or not placed):
+            delta, accepted = try_insert(rng.randrange(len(unplaced)), temperature)
+        elif roll < 0.6:
+            delta, accepted = try_move(placed[rng.randrange(len(placed))], temperature)
         else:
-            # If no alternative resources found, flag for manual resolution
-            flag_for_manual_resolution(course_no, section, session)
+            delta, accepted = try_swap(placed[rng.randrange(len(placed))], temperature)
 
-    return timetable
+        if accepted:
+            cost += delta
+            stats['accepted'] += 1
+
+    stats['final_cost'] = cost
+    return _same_shape(timetable, assignments), stats
 
-def get_session_length(session, course_info):
+def final_adjustments_and_validation(timetable, df_course_details, df_rooms, df_lecturer_prefs, time_slots, G,
+                                     resource_index=None, calendar=None, time_budget=5.0, seed=0):
     """
-    Determine the length of the session based on course information.
+    Make final adjustments to the timetable with a local-search pass and validate it, considering the sessions.
     """
-    contact_hours = course_info['ContactHours']
+    # Move, swap and insert sessions to cut clashes and unscheduled sessions
+    timetable, stats = improve_timetable(timetable, G, df_course_details, df_rooms, df_lecturer_prefs,
+                                         resource_index, calendar, time_budget, seed=seed)
 
-    # Define session lengths based on contact hours
-    if contact_hours == 3:
-        # For a 3-hour course, split into 2-hour and 1-hour sessions
-        return 2 if session == 1 else 1
-    elif contact_hours == 4:
-        # For a 4-hour course, two sessions of 2 hours each
-        return 2
-    elif contact_hours == 5:
-        # For a 5-hour course, two 2-hour sessions and one 1-hour session
-        return 2 if session in [1, 2] else 1
-    elif contact_hours == 6:
-        # For a 6-hour course, three sessions of 2 hours each
-        return 2
-    else:
-        # For courses with other contact hours, assuming a single session of the entire duration
-        return contact_hours
+    # Validate that all courses and sessions have been scheduled
+    validation_success = validate_complete_scheduling_with_sessions(timetable, df_course_details)
+
+    return timetable, validation_success
+
+def expected_sections(df_course_details):
+    """
+    Return one row per section the course details call for: CourseNo, Section and NumberofSessions.
+    """
+    df = df_course_details.reset_index(drop=True)
+    sections = df.loc[df.index.repeat(df['NumberOfSections']), ['CourseNo', 'NumberofSessions']]
+    sections['Section'] = sections.groupby(level=0).cumcount()
+    return sections.reset_index(drop=True)
 
-    return contact_hours
+def find_missing_sessions(timetable, df_course_details, expected=None):
+    """
+    Return the sections with fewer placed sessions than NumberofSessions.
 
+    Args:
+    expected (DataFrame): Precomputed expected_sections(df_course_details), if available.
 
-def find_alternative_resources(course_info, df_rooms, df_lecturer_prefs, time_slots, session_length):
+    Returns:
+    list: One dict per incomplete section with its course, section, expected and scheduled session counts.
     """
-    Find alternative time slot, room, and lecturer for a session.
+    if expected is None:
+        expected = expected_sections(df_course_details)
+    assignments = as_assignment_table(timetable)
+    placed = assignments.column('slot_id') >= 0
+    course_id = assignments.column('course_id')[placed].astype(np.int64)
+    section = assignments.column('section')[placed].astype(np.int64)
+
+    # Placed sessions per (course id, section), as a flat count array
+    expected_course = expected['CourseNo'].map(assignments.course_ids).fillna(-1).to_numpy(dtype=np.int64)
+    expected_section = expected['Section'].to_numpy(dtype=np.int64)
+    width = int(max(section.max(initial=0), expected_section.max(initial=0))) + 1
+    counts = np.bincount(course_id * width + section, minlength=max(len(assignments.courses), 1) * width)
+    scheduled = np.where(expected_course >= 0, counts[np.maximum(expected_course, 0) * width + expected_section], 0)
+
+    needed = expected['NumberofSessions'].to_numpy()
+    courses = expected['CourseNo'].to_numpy()
+    return [{'course': courses[i], 'section': int(expected_section[i]), 'expected': int(needed[i]), 'scheduled': int(scheduled[i])}
+            for i in np.flatnonzero(scheduled < needed)]
+
+def _expand_ranges(starts, lengths):
+    # Positions start, start + 1, ..., start + length - 1 for each range, concatenated
+    lengths = np.asarray(lengths, dtype=np.int64)
+    offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(np.asarray(starts, dtype=np.int64), lengths) + offsets
+
+
+class TimetableValidator:
     """
-    for time_slot in time_slots:
-        # Check if the time slot is suitable for the session length
-        if is_time_slot_suitable(time_slot, session_length, time_slots):
-            for room in df_rooms['RoomNo']:
-                if is_room_available_for_session(room, df_rooms, time_slot) and room_matches_course(room, course_info):
-                    for lecturer in df_lecturer_prefs['FacultyID']:
-                        if is_lecturer_available_for_session(lecturer, df_lecturer_prefs, time_slot) and lecturer_prefers_course(lecturer, course_info):
-                            if check_availability_for_session_length(room, lecturer, df_rooms, df_lecturer_prefs, time_slot, session_length, time_slots):
-                                return time_slot, room, lecturer
-    return None, None, None
+    Check a timetable against the scheduling constraints in a few vectorized passes.
+
+    Course, room and clash lookups are built once, so validate() is cheap enough to run
+    after every iteration of a search. Each placed session is expanded to the slots it
+    covers; room and lecturer double bookings are duplicate (slot, resource) pairs, and
+    student clashes come from the clash matrix restricted to the courses in each slot
+    (or to the sections in each slot, for a graph from build_section_clash_graph).
+
+    Args:
+    df_course_details (DataFrame): Course details, for room types and the expected sessions.
+    df_rooms (DataFrame): Rooms, for their types.
+    G (Graph): The weighted clash graph; None skips the student clash check.
+    calendar (SlotCalendar): Calendar of the timetables to validate.
+    """
+
+    def __init__(self, df_course_details, df_rooms, G=None, calendar=None):
+        if calendar is None:
+            calendar = get_default_calendar()
+        self.calendar = calendar
+        self.course_room_type = df_course_details.set_index('CourseNo')['RoomType'].to_dict()
+        self.room_type = df_rooms.set_index('RoomNo')['Type'].to_dict()
+        self.room_capacity = df_rooms.set_index('RoomNo')['Capacity'].to_dict() if 'Capacity' in df_rooms else {}
+        self.course_size = df_course_details.set_index('CourseNo')['AverageStudentsPerSection'].to_dict() \
+            if 'AverageStudentsPerSection' in df_course_details else {}
+        self.expected = expected_sections(df_course_details)
+
+        # valid_start[length, slot] is True where a session of that length may start
+        n_slots = len(calendar.time_slots)
+        self.valid_start = np.zeros((max(calendar.valid_starts_by_length, default=0) + 1, n_slots), dtype=bool)
+        for length, starts in calendar.valid_starts_by_length.items():
+            self.valid_start[length, list(starts)] = True
+
+        self.graph_index = None
+        if G is not None:
+            nodes = list(G.nodes)
+            self.graph_index = {course: i for i, course in enumerate(nodes)}
+            self.graph_nodes = nodes
+            self.by_section = G.graph.get('sections', False)
+            if self.by_section:
+                # (course, section) nodes: each node's course as a code into node_courses, and its section
+                self.node_course_codes, self.node_courses = pd.factorize(pd.Index([course for course, _ in nodes], dtype=object))
+                self.node_sections = np.array([section for _, section in nodes], dtype=np.int64)
+            # Each clashing pair once, from the lower-numbered course
+            clash_matrix = nx.to_scipy_sparse_array(G, nodelist=nodes, weight='weight', format='csr')
+            self.clash_upper = sparse.triu(clash_matrix, k=1, format='csr')
+
+    @staticmethod
+    def _session_ref(assignments, row):
+        return {'course': assignments.course_of(row), 'section': int(assignments.data['section'][row]),
+                'session': int(assignments.data['session_idx'][row])}
+
+    def _double_bookings(self, assignments, cover_rows, cover_slots, column, names, label):
+        resource_ids = assignments.column(column)[cover_rows]
+        booked = resource_ids >= 0
+        rows, slots, resource_ids = cover_rows[booked], cover_slots[booked], resource_ids[booked]
+        if not len(rows):
+            return []
+        keys = slots.astype(np.int64) * (int(resource_ids.max()) + 1) + resource_ids
+        order = np.argsort(keys, kind='stable')
+        _, first, counts = np.unique(keys[order], return_index=True, return_counts=True)
+        clashes = []
+        for start, count in zip(first[counts > 1], counts[counts > 1]):
+            group = order[start:start + count]
+            clashes.append({'time_slot': self.calendar.time_slots[slots[group[0]]], label: names[resource_ids[group[0]]],
+                            'sessions': [self._session_ref(assignments, row) for row in rows[group]]})
+        return clashes
+
+    def _graph_nodes(self, assignments, cover_rows):
+        # Clash graph node index of each covered row, -1 when it is not in the graph
+        course_ids = assignments.column('course_id')[cover_rows]
+        if not self.by_section:
+            graph_index = np.array([self.graph_index.get(course, -1) for course in assignments.courses] + [-1], dtype=np.int64)
+            return graph_index[course_ids]
+        sections = assignments.column('section')[cover_rows]
+        width = int(sections.max()) + 1 if len(sections) else 1
+        lookup = np.full((len(assignments.courses) + 1, width), -1, dtype=np.int64)
+        for (course, section), i in self.graph_index.items():
+            course_id = assignments.course_ids.get(course)
+            if course_id is not None and section < width:
+                lookup[course_id, section] = i
+        return lookup[course_ids, sections]
+
+    def _student_clashes(self, assignments, cover_rows, cover_slots, pairs=True):
+        nodes = self._graph_nodes(assignments, cover_rows)
+        in_graph = nodes >= 0
+
+        # Sessions per (slot, course); several sections of a course in one slot add up
+        occupancy = np.zeros((len(self.calendar.time_slots), len(self.graph_nodes)), dtype=np.int64)
+        np.add.at(occupancy, (cover_slots[in_graph], nodes[in_graph]), 1)
+        if not pairs:
+            # Total only: sum over slots of occupancy . clash_upper . occupancy
+            return None, int((occupancy.T * (self.clash_upper @ occupancy.T)).sum())
+
+        # Follow every clash edge out of each occupied (slot, course) and keep those whose other end is there too
+        upper = self.clash_upper
+        slots, courses = np.nonzero(occupancy)
+        degree = upper.indptr[courses + 1] - upper.indptr[courses]
+        edges = _expand_ranges(upper.indptr[courses], degree)
+        slots, courses = np.repeat(slots, degree), np.repeat(courses, degree)
+        others = upper.indices[edges]
+        students = upper.data[edges] * occupancy[slots, courses] * occupancy[slots, others]
+        hit = students > 0
+
+        # Categoricals keep the course and slot names as codes instead of building strings
+        slots, courses, others = slots[hit], courses[hit], others[hit]
+        if not self.by_section:
+            clashes = pd.DataFrame({
+                'TimeSlot': pd.Categorical.from_codes(slots, self.calendar.time_slots),
+                'Course1': pd.Categorical.from_codes(courses, self.graph_nodes),
+                'Course2': pd.Categorical.from_codes(others, self.graph_nodes),
+                'Students': students[hit],
+            })
+        else:
+            clashes = pd.DataFrame({
+                'TimeSlot': pd.Categorical.from_codes(slots, self.calendar.time_slots),
+                'Course1': pd.Categorical.from_codes(self.node_course_codes[courses], self.node_courses),
+                'Section1': self.node_sections[courses],
+                'Course2': pd.Categorical.from_codes(self.node_course_codes[others], self.node_courses),
+                'Section2': self.node_sections[others],
+                'Students': students[hit],
+            })
+        return clashes, int(students.sum())
+
+    def validate(self, timetable, clash_pairs=True):
+        """
+        Validate a timetable against the scheduling constraints.
+
+        A timetable is valid when it has no double bookings, room type mismatches, blocked
+        slots or missing sessions. Student clashes and room capacity shortfalls are
+        reported but do not make it invalid.
+
+        Args:
+        timetable (AssignmentTable): The timetable, or a (course, section) -> sessions dict.
+        clash_pairs (bool): List every clashing pair; False only computes student_clash_total, which is faster.
+
+        Returns:
+        dict: The report:
+              - 'sessions', 'scheduled', 'unscheduled': session counts;
+              - 'room_double_bookings', 'lecturer_double_bookings', 'room_type_mismatches',
+                'blocked_slots', 'missing_sessions', 'room_capacity_shortfalls': lists of
+                the offending sessions;
+              - 'student_clashes': DataFrame with one row per clashing pair and hour
+                (TimeSlot, Course1, Course2, Students, plus Section1 and Section2 on a
+                section-level graph), None without a clash graph or with clash_pairs=False;
+              - 'student_clash_total': clashing students summed over hours, None without a clash graph;
+              - 'valid': True when none of the hard constraints above is broken.
+        """
+        assignments = as_assignment_table(timetable, self.calendar)
+        n_slots = len(self.calendar.time_slots)
+        slot_id, length = assignments.column('slot_id'), assignments.column('length')
+        placed = np.flatnonzero(slot_id >= 0)
+        starts, lengths = slot_id[placed].astype(np.int64), length[placed].astype(np.int64)
+
+        # Sessions starting where their length does not fit (blackouts, end of day)
+        known_length = (lengths > 0) & (lengths < self.valid_start.shape[0])
+        fits = np.zeros(len(placed), dtype=bool)
+        fits[known_length] = self.valid_start[lengths[known_length], starts[known_length]]
+        blocked_slots = [dict(self._session_ref(assignments, row), time_slot=self.calendar.time_slots[slot_id[row]],
+                              length=int(length[row])) for row in placed[~fits]]
+
+        # Expand each placed session to the slots it covers
+        spans = np.maximum(lengths, 1)
+        cover_rows = np.repeat(placed, spans)
+        cover_slots = _expand_ranges(starts, spans)
+        in_calendar = cover_slots < n_slots
+        cover_rows, cover_slots = cover_rows[in_calendar], cover_slots[in_calendar]
+
+        # Rooms of the wrong type for the course
+        room_types = np.array([self.room_type.get(room) for room in assignments.rooms] + [None], dtype=object)
+        required = np.array([self.course_room_type.get(course) for course in assignments.courses] + [None], dtype=object)
+        room_id = assignments.column('room_id')[placed]
+        assigned_type = room_types[room_id]
+        required_type = required[assignments.column('course_id')[placed]]
+        mismatched = placed[(room_id >= 0) & (assigned_type != required_type)]
+        room_type_mismatches = [dict(self._session_ref(assignments, row), room=assignments.room_of(row),
+                                     room_type=room_types[assignments.data['room_id'][row]],
+                                     required=required[assignments.data['course_id'][row]]) for row in mismatched]
+
+        # Rooms with fewer seats than the section's average size; NaN (unknown) never compares as short
+        capacity = np.array([self.room_capacity.get(room, np.nan) for room in assignments.rooms] + [np.nan], dtype=float)
+        size = np.array([self.course_size.get(course, np.nan) for course in assignments.courses] + [np.nan], dtype=float)
+        seats, students = capacity[room_id], size[assignments.column('course_id')[placed]]
+        room_capacity_shortfalls = [dict(self._session_ref(assignments, row), room=assignments.room_of(row),
+                                         capacity=int(seats[i]), students=int(students[i]))
+                                    for i, row in zip(np.flatnonzero(seats < students).tolist(), placed[seats < students].tolist())]
+
+        missing_sessions = find_missing_sessions(assignments, None, self.expected)
+
+        report = {
+            'sessions': len(assignments),
+            'scheduled': len(placed),
+            'unscheduled': len(assignments) - len(placed),
+            'room_double_bookings': self._double_bookings(assignments, cover_rows, cover_slots, 'room_id', assignments.rooms, 'room'),
+            'lecturer_double_bookings': self._double_bookings(assignments, cover_rows, cover_slots, 'lecturer_id',
+                                                              assignments.lecturers, 'lecturer'),
+            'room_type_mismatches': room_type_mismatches,
+            'room_capacity_shortfalls': room_capacity_shortfalls,
+            'blocked_slots': blocked_slots,
+            'missing_sessions': missing_sessions,
+            'student_clashes': None,
+            'student_clash_total': None,
+        }
+        if self.graph_index is not None:
+            report['student_clashes'], report['student_clash_total'] = self._student_clashes(
+                assignments, cover_rows, cover_slots, clash_pairs)
+        report['valid'] = not any(report[key] for key in ('room_double_bookings', 'lecturer_double_bookings',
+                                                           'room_type_mismatches', 'blocked_slots', 'missing_sessions'))
+        return report
+
+def write_validation_report(report, path):
+    """
+    Write a TimetableValidator report to a JSON file, with student clashes as a list of records.
+    """
+    report = dict(report)
+    if report['student_clashes'] is not None:
+        report['student_clashes'] = report['student_clashes'].astype({'TimeSlot': object, 'Course1': object, 'Course2': object}) \
+            .to_dict('records')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=int)
+
+def validate_timetable(timetable, df_course_details, df_rooms, G=None, calendar=None):
+    """
+    Validate a timetable once; see TimetableValidator for the checks and the report format.
+    """
+    return TimetableValidator(df_course_details, df_rooms, G, calendar).validate(timetable)
 
-def update_timetable(timetable, course_no, section, session, new_time_slot, new_room, new_lecturer):
+def check_for_conflicts_with_sessions(timetable, df_course_details, df_rooms, df_lecturer_prefs, time_slots, G=None, calendar=None):
     """
-    Update the timetable with new resources for a session.
+    Check the timetable for any scheduling conflicts or unmet constraints, considering sessions.
+
+    Returns:
+    list: One dict per conflicting session with its course, section, session index and conflict type
+          ('room_double_booking', 'lecturer_double_booking', 'room_type_mismatch' or 'blocked_slot').
     """
-    # Update the timetable entry for this session
-    timetable[(course_no, section)][session] = {'time_slot': new_time_slot, 'room': new_room, 'lecturer': new_lecturer}
+    report = validate_timetable(timetable, df_course_details, df_rooms, G, calendar)
+    conflicts = []
+    for key, conflict_type in (('room_double_bookings', 'room_double_booking'),
+                               ('lecturer_double_bookings', 'lecturer_double_booking')):
+        for booking in report[key]:
+            for session in booking['sessions']:
+                conflicts.append(dict(session, type=conflict_type, time_slot=booking['time_slot']))
+    for key, conflict_type in (('room_type_mismatches', 'room_type_mismatch'), ('blocked_slots', 'blocked_slot')):
+        for item in report[key]:
+            conflicts.append(dict(item, type=conflict_type))
+    return conflicts
 
-def flag_for_manual_resolution(course_no, section, session, flagged_sessions):
+def resolve_conflicts_with_sessions(timetable, conflicts, df_course_details, df_rooms, df_lecturer_prefs, time_slots,
+                                    resource_index=None, calendar=None, G=None):
     """
-    Flag a session for manual resolution if no alternative resources are found.
-    
-    Args:
-    course_no (str): The course number.
-    section (int): The section number of the course.
-    session (dict): A dictionary containing session details.
-    flagged_sessions (list): A list to store details of flagged sessions.
-
-    # Example usage
-    flagged_sessions = []
-    # Assuming you have a session that needs to be flagged
-    session_example = {'time_slot': None, 'room': None, 'lecturer': None}
-    flag_for_manual_resolution('CS101', 1, session_example, flagged_sessions)
-    """
-    # Add the session details to the flagged_sessions list
-    flagged_session_info = {
-        'CourseNo': course_no,
-        'Section': section,
-        'Session': session,
-        'Reason': 'Unable to find suitable time slot, room, or lecturer'
-    }
-    flagged_sessions.append(flagged_session_info)
+    Attempt to resolve any identified conflicts, considering sessions.
+
+    Every session named in `conflicts` (as returned by check_for_conflicts_with_sessions)
+    is unscheduled and handed to repair_unscheduled_sessions with the rest of the
+    placeholders; sessions it cannot place keep REPAIR_FAILED_REASON for manual resolution.
+
+    Returns:
+    tuple: (timetable, repair stats)
+    """
+    if resource_index is None:
+        resource_index = build_resource_index(df_rooms, df_lecturer_prefs)
+    if calendar is None:
+        calendar = get_default_calendar()
+    assignments = as_assignment_table(timetable, calendar)
+
+    for conflict in conflicts:
+        row = assignments.rows_for_section(conflict['course'], conflict['section'])[conflict['session']]
+        assignments.set_session(row, None, None, None, reason=f"Unscheduled to resolve a {conflict['type'].replace('_', ' ')}")
+
+    # Rebuild availability and clashes from the sessions that stay
+    room_availability, lecturer_availability = build_availability_from_timetable(assignments, df_rooms, df_lecturer_prefs, calendar)
+    occupancy = None
+    if G is not None:
+        occupancy = ClashOccupancy(G, len(calendar.time_slots))
+        for row in range(len(assignments)):
+            if assignments.slot_of(row) is not None:
+                occupancy.add(occupancy.node(assignments.course_of(row), assignments.section_of(row)),
+                              assignments.slot_of(row), assignments.length_of(row))
+
+    stats = repair_unscheduled_sessions(assignments, df_course_details, room_availability, lecturer_availability,
+                                        resource_index, calendar, occupancy)
+    return _same_shape(timetable, assignments), stats
 
 
 def validate_complete_scheduling_with_sessions(timetable, df_course_details):
     """
     Validate that all courses and their sessions have been scheduled.
     """
-    for index, course_info in df_course_details.iterrows():
-        course_no = course_info['CourseNo']
-        number_of_sections = course_info['NumberOfSections']
-        for section in range(number_of_sections):
-            if (course_no, section) not in timetable or len(timetable[(course_no, section)]) < course_info['NumberofSessions']:
-                return False  # Not all sessions have been scheduled
-    return True
+    # Placeholder sessions do not count; every section needs NumberofSessions placed sessions
+    return not find_missing_sessions(timetable, df_course_details)
 
 # Step 7: Output
 
 def output_timetable_with_sessions(timetable, output_file_path):
     """
     Output the final timetable with session details to a CSV file.
-    """
-    # Prepare data for output
-    output_data = []
-    for (course, section), sessions in timetable.items():
-        for session in sessions:
-            output_data.append({
-                'Course': course,
-                'Section': section,
-                'TimeSlot': session['time_slot'],
-                'Room': session['room'],
-                'Lecturer': session['lecturer']
-            })
 
-    # Create a DataFrame and write to CSV
-    df_timetable = pd.DataFrame(output_data)
+    The timetable may be an AssignmentTable or a (course, section) -> sessions dict.
+    """
+    if isinstance(timetable, AssignmentTable):
+        df_timetable = timetable.to_frame()
+    else:
+        # Prepare data for output
+        output_data = []
+        for (course, section), sessions in timetable.items():
+            for session in sessions:
+                output_data.append({
+                    'Course': course,
+                    'Section': section,
+                    'TimeSlot': session['time_slot'],
+                    'Room': session['room'],
+                    'Lecturer': session['lecturer']
+                })
+        df_timetable = pd.DataFrame(output_data)
+
+    # Write to CSV
     df_timetable.to_csv(output_file_path, index=False)
-    print(f"Timetable with sessions has been successfully saved to {output_file_path}")
+
+def session_frame(timetable, calendar=None):
+    """
+    Return one row per session: Course, Section, Session, TimeSlot, Day, Start, End, Length, Room and Lecturer.
+
+    The columns are taken straight from the AssignmentTable arrays, in section order.
+    Start and End are hours; unscheduled sessions have no TimeSlot, Day, Start or End.
+    """
+    assignments = as_assignment_table(timetable, calendar)
+    calendar = assignments.calendar
+    order = assignments.row_order()
+    slot_id, length = assignments.column('slot_id')[order], assignments.column('length')[order]
+    placed = slot_id >= 0
+    safe_slot = np.where(placed, slot_id, 0)
+
+    df_sessions = assignments.to_frame()
+    df_sessions.insert(2, 'Session', assignments.column('session_idx')[order])
+    day_names = np.array(list(calendar.days) + [None], dtype=object)
+    df_sessions.insert(4, 'Day', day_names[np.where(placed, calendar.day[safe_slot] if len(calendar.day) else -1, -1)])
+    start = calendar.hour[safe_slot].astype(np.int64) if len(calendar.hour) else np.zeros(len(order), dtype=np.int64)
+    df_sessions.insert(5, 'Start', pd.arrays.IntegerArray(start, ~placed))
+    df_sessions.insert(6, 'End', pd.arrays.IntegerArray(start + length, ~placed))
+    df_sessions.insert(7, 'Length', length)
+    return df_sessions
+
+def write_frame(df, output_file_path):
+    """
+    Write a DataFrame as CSV, Parquet or JSON records, chosen by the file extension.
+    """
+    extension = os.path.splitext(output_file_path)[1].lower()
+    if extension == '.csv':
+        df.to_csv(output_file_path, index=False)
+    elif extension == '.parquet':
+        df.to_parquet(output_file_path, index=False)
+    elif extension == '.json':
+        df.to_json(output_file_path, orient='records', indent=2)
+    else:
+        raise ValueError(f"Unsupported export format '{extension}' for {output_file_path}; use .csv, .parquet or .json")
+
+def export_timetable(timetable, output_file_path, calendar=None):
+    """
+    Write the session_frame of a timetable to a .csv, .parquet or .json file.
+    """
+    write_frame(session_frame(timetable, calendar), output_file_path)
+
+def _session_hours(df_sessions):
+    # One row per hour covered by a placed session, with the hour in 'Hour'
+    placed = df_sessions[df_sessions['Day'].notna()]
+    lengths = placed['Length'].to_numpy(dtype=np.int64)
+    df_hours = placed.iloc[np.repeat(np.arange(len(placed)), lengths)].reset_index(drop=True)
+    df_hours['Hour'] = _expand_ranges(placed['Start'].to_numpy(dtype=np.int64), lengths)
+    return df_hours
+
+def timetable_grids(df_cells, key, calendar, keys=None):
+    """
+    Pivot (key, Day, Hour, Label) rows into one weekly grid per key, laid out like Timetable_Template.docx.
+
+    Each grid has a row per teaching hour (labelled "8:00 – 9:00"), a column per day, and
+    the labels of the sessions in each cell joined with ", ". The labels are joined in one
+    groupby over all keys and scattered into a (key, hour, day) array, so the cost does
+    not grow with a per-key loop.
+
+    Args:
+    df_cells (DataFrame): One row per covered hour, e.g. from _session_hours, with a 'Label' column.
+    key (str): Column to split the grids on, such as 'Course', 'Room' or 'StudentNo'.
+    keys (list): Optional keys in the order wanted; keys without sessions get an empty grid.
+
+    Returns:
+    dict: key -> DataFrame grid.
+    """
+    n_hours = max(calendar.end_hour - calendar.start_hour, 0)
+    hour_labels = pd.Index([f"{hour}:00 – {hour + 1}:00" for hour in range(calendar.start_hour, calendar.end_hour)], name='TIME')
+    columns = [day.upper() for day in calendar.days]
+    if keys is None:
+        keys = pd.unique(df_cells[key]).tolist()
+
+    cells = df_cells.groupby([key, 'Hour', 'Day'], sort=False)['Label'].agg(', '.join).reset_index()
+    key_codes = pd.Index(keys).get_indexer(cells[key])
+    hour_codes = cells['Hour'].to_numpy(dtype=np.int64) - calendar.start_hour
+    day_codes = pd.Index(calendar.days).get_indexer(cells['Day'])
+    known = (key_codes >= 0) & (hour_codes >= 0) & (hour_codes < n_hours) & (day_codes >= 0)
+
+    values = np.full((len(keys), n_hours, len(columns)), '', dtype=object)
+    values[key_codes[known], hour_codes[known], day_codes[known]] = cells['Label'].to_numpy()[known]
+    return {value: pd.DataFrame(values[i], index=hour_labels, columns=columns) for i, value in enumerate(keys)}
+
+def course_grids(timetable, df_course_details, calendar=None):
+    """
+    Return {course: grid} with the sections ("Sec 1", "Sec 2", ...) meeting in each hour, as in Course Wise Tables.docx.
+    """
+    assignments = as_assignment_table(timetable, calendar)
+    df_hours = _session_hours(session_frame(assignments))
+    df_hours['Label'] = 'Sec ' + (df_hours['Section'] + 1).astype(str)
+    df_hours = df_hours.sort_values(['Course', 'Section'], kind='stable')
+    return timetable_grids(df_hours, 'Course', assignments.calendar, df_course_details['CourseNo'].drop_duplicates().tolist())
+
+def room_grids(timetable, df_rooms, calendar=None):
+    """
+    Return {room: grid} with the course, section and lecturer using the room in each hour.
+    """
+    assignments = as_assignment_table(timetable, calendar)
+    df_hours = _session_hours(session_frame(assignments))
+    df_hours['Label'] = df_hours['Course'].astype(str) + ' Sec ' + (df_hours['Section'] + 1).astype(str) + \
+        ' (' + df_hours['Lecturer'].fillna('').astype(str) + ')'
+    return timetable_grids(df_hours, 'Room', assignments.calendar, df_rooms['RoomNo'].tolist())
+
+def student_timetables(timetable, df_sections, calendar=None):
+    """
+    Join the student sectioning (see assign_students_to_sections) with the timetable.
+
+    Returns:
+    DataFrame: One row per student and session of the sections they are in, with the
+               session_frame columns plus StudentNo, sorted by student.
+    """
+    df_sessions = session_frame(timetable, calendar)
+    df_students = df_sections[['StudentNo', 'CourseNo', 'Section']].rename(columns={'CourseNo': 'Course'})
+    df_students = df_students.merge(df_sessions, on=['Course', 'Section'], how='inner')
+    return df_students.sort_values('StudentNo', kind='stable').reset_index(drop=True)
+
+def _grid_html(grid):
+    # A plain <table> for one grid; DataFrame.to_html is far slower over hundreds of grids
+    header = ''.join(f"<th>{html.escape(str(column))}</th>" for column in grid.columns)
+    rows = ''.join(f"<tr><th>{html.escape(str(label))}</th>" + ''.join(f"<td>{html.escape(str(cell))}</td>" for cell in row) + '</tr>'
+                   for label, row in zip(grid.index, grid.to_numpy()))
+    return f"<table><thead><tr><th>{html.escape(str(grid.index.name or ''))}</th>{header}</tr></thead><tbody>{rows}</tbody></table>"
+
+def write_grids_html(grids, output_file_path, titles=None):
+    """
+    Write grids from timetable_grids to one HTML file, with a heading and a table per grid.
+    """
+    parts = ['<!DOCTYPE html>\n<html><head><meta charset="utf-8"><style>'
+             'table{border-collapse:collapse;margin-bottom:2em}th,td{border:1px solid #888;padding:2px 6px}'
+             '</style></head><body>']
+    for key, grid in grids.items():
+        title = titles.get(key, key) if titles is not None else key
+        parts.append(f"<h2>{html.escape(str(title))}</h2>")
+        parts.append(_grid_html(grid))
+    parts.append('</body></html>')
+    with open(output_file_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(parts))
+
+def export_grids(timetable, df_course_details, df_rooms, output_dir, calendar=None):
+    """
+    Write the per-course and per-room grids to course_grids.html and room_grids.html in output_dir.
+
+    The headings follow the Word templates: "<course> (<name>) # of Sections: <n> (<h> Contact Hours)"
+    and "<room> (<capacity>) - <type>".
+
+    Returns:
+    list: The paths written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    details = df_course_details.drop_duplicates('CourseNo').set_index('CourseNo')
+    course_titles = {course: f"{course} ({info['CourseName']}) # of Sections: {info['NumberOfSections']} "
+                             f"({info['ContactHours']} Contact Hours)" for course, info in details.to_dict('index').items()}
+    room_titles = {room: f"{room} ({capacity}) - {room_type}"
+                   for room, capacity, room_type in zip(df_rooms['RoomNo'], df_rooms['Capacity'], df_rooms['Type'])}
+
+    paths = [os.path.join(output_dir, 'course_grids.html'), os.path.join(output_dir, 'room_grids.html')]
+    write_grids_html(course_grids(timetable, df_course_details, calendar), paths[0], course_titles)
+    write_grids_html(room_grids(timetable, df_rooms, calendar), paths[1], room_titles)
+    return paths
+
+def export_student_timetables(timetable, df_sections, output_file_path, calendar=None):
+    """
+    Write every student's timetable: one grid per student for .html, else the joined rows as .csv, .parquet or .json.
+
+    Returns:
+    int: The number of students written.
+    """
+    assignments = as_assignment_table(timetable, calendar)
+    df_students = student_timetables(assignments, df_sections)
+    if os.path.splitext(output_file_path)[1].lower() == '.html':
+        df_hours = _session_hours(df_students)
+        df_hours['Label'] = df_hours['Course'].astype(str) + ' Sec ' + (df_hours['Section'] + 1).astype(str) + \
+            ' (' + df_hours['Room'].fillna('').astype(str) + ')'
+        write_grids_html(timetable_grids(df_hours, 'StudentNo', assignments.calendar), output_file_path)
+    else:
+        write_frame(df_students, output_file_path)
+    return df_students['StudentNo'].nunique()
 
 
 # def output_timetable(timetable, output_file_path):
@@ -797,43 +3700,246 @@ def output_timetable_with_sessions(timetable, output_file_path):
 
 
 # Main execution
-def main():
-    # Main execution to load and preprocess data
-    df_advised_courses, course_name_map, \
-        course_room_map, course_details_map, \
-            room_capacity_map, lecturer_prefs_map = load_and_preprocess_data()
-    
-    
+def run_timetabling(problem, output_file_path='final_timetable.csv', order='cliques', clique_mode='all', clique_limit=None,
+                    max_clash=None, starts=1, workers=None, seed=0, improve=0.0, validation_path=None, load_report_path=None,
+                    section_clashes=False, exports=(), grids_dir=None, student_timetables_path=None):
+    """
+    Build a timetable for the problem and write it to output_file_path.
+
+    Courses are always ordered on the course-level clash graph. With section_clashes, students
+    are first split into sections (assign_students_to_sections) and placement, local search and
+    validation count clashes on the section-level graph, so sections of a multi-section course
+    only block the slots of the sections their own students attend.
+
+    Each stage is timed when a PipelineProfiler is active (see profiling). With validation_path,
+    the timetable is checked by TimetableValidator and the report written there as JSON. With
+    load_report_path, each lecturer's load against MaxLoad is written there as CSV.
+
+    Each path in exports gets the session_frame as .csv, .parquet or .json; grids_dir gets the
+    per-course and per-room grids (export_grids); student_timetables_path gets every student's
+    timetable from the student sectioning (export_student_timetables).
+
+    Returns:
+    AssignmentTable: The timetable; to_timetable() gives the (course, section) -> list of session dicts.
+    """
+    with profile_stage('load'):
+        df_course_details = problem.df_course_details
+        df_rooms = problem.df_rooms
+        df_lecturer_prefs = problem.df_lecturer_prefs
+        calendar = problem.calendar
+
     # construct the clash graph
-    cliques = construct_graph_and_find_cliques(df_advised_courses)
-
-    # sort the cliques by total enrollment
-    sorted_cliques = sort_cliques_by_total_enrollment(cliques, df_course_details)
-
-    # sorted_cliques = sort_cliques_by_size(cliques)
-
-    # Function to format course info
-    # def format_course(course_no):
-    #    course_name = course_name_map.get(course_no, "Unknown Course")
-    #    return f"{course_no}-{course_name}"
-
-    # for i, clique in enumerate(sorted_cliques, start=1):
-    #    formatted_clique = [format_course(course) for course in clique]
-    #    student_counts = {course: df_advised_courses[df_advised_courses['CourseNo'] == course]['StudentNo'].nunique() for course in clique}
-    #    print(f"Clique {i}: {student_counts}")
-
-    timetable, room_availability, lecturer_availability, time_slots = schedule_sections(sorted_cliques, df_course_details, df_rooms, df_lecturer_prefs)
-    
-    # print(timetable)
-    timetable = handle_unscheduled_courses_and_sessions(timetable, df_course_details, room_availability, lecturer_availability, time_slots)
-   
-    # final_adjustments_and_validation(timetable)
-    # timetable, validation_success = final_adjustments_and_validation(timetable, df_course_details, df_rooms, df_lecturer_prefs, time_slots)
-    
-    # Specify the output file path
-    output_file_path = 'final_timetable.csv'
-    # Assuming timetable is already created and loaded
-    output_timetable_with_sessions(timetable, output_file_path)
+    with profile_stage('clash_graph'):
+        G = problem.clash_graph
+
+    # Clashes are counted between sections once the students are split into them
+    clash_G = G
+    if section_clashes:
+        with profile_stage('sectioning'):
+            clash_G = problem.section_clash_graph
+
+    # Build the room and lecturer lookups once for scheduling and repair
+    with profile_stage('resource_index'):
+        resource_index = problem.resource_index
+
+    if starts > 1:
+        # Several perturbed orderings in parallel, keeping the best-scoring timetable
+        cliques, course_order = None, None
+        with profile_stage('cliques' if order == 'cliques' else 'ordering'):
+            if order == 'cliques':
+                cliques = problem.ranked_cliques(clique_mode, clique_limit)
+            else:
+                course_order = order_courses(G, df_course_details, order)
+        with profile_stage('multistart'):
+            timetable, score, best_start = multistart_schedule(cliques, clash_G, df_course_details, df_rooms, df_lecturer_prefs,
+                                                               resource_index, calendar, starts, workers, seed, max_clash,
+                                                               course_order)
+        print(f"Best of {starts} starts: start {best_start} with {score[0]} unscheduled sessions, "
+              f"{score[1]} student clashes, preference cost {score[2]}")
+    else:
+        # order the courses: walk the cliques sorted by total enrollment ('top-k' and 'cover' bound the work),
+        # or use a DSATUR / weighted-degree ordering of the clash graph
+        with profile_stage('cliques' if order == 'cliques' else 'ordering'):
+            if order == 'cliques':
+                course_order = order_courses_by_cliques(problem.ranked_cliques(clique_mode, clique_limit), df_course_details)
+            else:
+                course_order = order_courses(G, df_course_details, order)
+
+        # Track which courses sit in each slot so placements can avoid student clashes
+        occupancy = ClashOccupancy(clash_G, len(calendar.time_slots), max_clash)
+
+        with profile_stage('schedule_sections'):
+            timetable, room_availability, lecturer_availability, time_slots, skipped_courses = schedule_courses(course_order, df_course_details, df_rooms, df_lecturer_prefs, resource_index, calendar, occupancy)
+        if skipped_courses:
+            print(f"Skipped {len(skipped_courses)} courses with no course details: {', '.join(map(str, skipped_courses))}")
+
+        with profile_stage('handle_unscheduled'):
+            timetable, stats = handle_unscheduled_courses_and_sessions(timetable, df_course_details, room_availability, lecturer_availability, time_slots, resource_index, calendar, occupancy)
+        print(f"Repair: {stats['queued']} unscheduled sessions, placed {stats['any-day']} on another day, "
+              f"{stats['adjacent']} next to their section, {stats['ejection']} by ejection and "
+              f"{stats['overload']} by taking a lecturer past MaxLoad; {stats['unscheduled']} left")
+
+    # Local search on the greedy timetable for the given number of seconds
+    if improve > 0:
+        with profile_stage('improve'):
+            timetable, stats = improve_timetable(timetable, clash_G, df_course_details, df_rooms, df_lecturer_prefs,
+                                                 resource_index, calendar, time_budget=improve, seed=seed)
+        print(f"Local search: cost {stats['initial_cost']} -> {stats['final_cost']} "
+              f"({stats['accepted']} of {stats['iterations']} moves accepted)")
+
+    with profile_stage('output'):
+        output_timetable_with_sessions(timetable, output_file_path)
+    print(f"Timetable with sessions has been successfully saved to {output_file_path}")
+
+    if exports or grids_dir or student_timetables_path:
+        with profile_stage('export'):
+            for export_path in exports:
+                export_timetable(timetable, export_path, calendar)
+                print(f"Timetable exported to {export_path}")
+            if grids_dir:
+                paths = export_grids(timetable, df_course_details, df_rooms, grids_dir, calendar)
+                print(f"Course and room grids written to {', '.join(paths)}")
+            if student_timetables_path:
+                n_students = export_student_timetables(timetable, problem.student_sections, student_timetables_path, calendar)
+                print(f"Timetables for {n_students} students written to {student_timetables_path}")
+
+    with profile_stage('lecturer_load'):
+        df_load = lecturer_load_report(timetable, df_rooms, df_lecturer_prefs, calendar)
+        if load_report_path:
+            df_load.to_csv(load_report_path, index=False)
+    over = df_load[df_load['Remaining'] < 0]
+    print(f"Lecturer load: {int(df_load['Load'].sum())} hours booked, {int(df_load['Remaining'].clip(lower=0).sum())} hours "
+          f"of MaxLoad left, {len(over)} lecturers over MaxLoad by {int(-over['Remaining'].sum())} hours"
+          + (f"; report written to {load_report_path}" if load_report_path else ""))
+
+    if validation_path:
+        with profile_stage('validate'):
+            report = TimetableValidator(df_course_details, df_rooms, clash_G, calendar).validate(timetable)
+            write_validation_report(report, validation_path)
+        print(f"Validation: {'valid' if report['valid'] else 'INVALID'}, {report['unscheduled']} unscheduled sessions, "
+              f"{len(report['room_double_bookings'])} room and {len(report['lecturer_double_bookings'])} lecturer double bookings, "
+              f"{report['student_clash_total']} student clashes; report written to {validation_path}")
+    return timetable
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog='greedy_timetabling', description="Greedy course timetabling")
+    parser.add_argument('--advised', default=DEFAULT_ADVISED_COURSES,
+                        help=f"advising records CSV (default: {DEFAULT_ADVISED_COURSES})")
+    parser.add_argument('--course-details', default=DEFAULT_COURSE_DETAILS,
+                        help=f"course details CSV (default: {DEFAULT_COURSE_DETAILS})")
+    parser.add_argument('--rooms', default=DEFAULT_ROOMS,
+                        help=f"rooms CSV (default: {DEFAULT_ROOMS})")
+    parser.add_argument('--lecturers', default=DEFAULT_LECTURER_PREFS,
+                        help=f"lecturer preferences CSV (default: {DEFAULT_LECTURER_PREFS})")
+    parser.add_argument('--equivalences', default=None, metavar='PATH',
+                        help="course equivalence CSV (CourseNo, EquivalentCourseNo) used to merge cross-listed codes "
+                             f"(default: {DEFAULT_COURSE_EQUIVALENCES} when present)")
+    parser.add_argument('--bundle', default=None,
+                        help="load the inputs and clash graph from a compiled problem bundle instead of the CSV files")
+    parser.add_argument('--compile', default=None, metavar='BUNDLE_DIR',
+                        help="compile the CSV inputs into a problem bundle and exit")
+    parser.add_argument('--cache-dir', default=None,
+                        help="cache clash graphs and cliques in this directory, keyed on the advising data (default: off)")
+    parser.add_argument('--cache-size', type=int, default=256, metavar='MB',
+                        help="size limit for --cache-dir before old entries are evicted (default: 256)")
+    parser.add_argument('--advising-delta', action='append', default=[], metavar='PATH',
+                        help="apply advising changes (StudentNo, CourseNo, Action add/remove) to the clash graph "
+                             "and cliques incrementally; repeatable")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="stream the advising file in chunks of this many rows to build the clash graph")
+    parser.add_argument('--out', default='final_timetable.csv',
+                        help="output timetable CSV (default: final_timetable.csv)")
+    parser.add_argument('--days', nargs='+', default=None,
+                        help="teaching days in order (default: Sunday to Thursday)")
+    parser.add_argument('--start-hour', type=int, default=DEFAULT_START_HOUR,
+                        help=f"first teaching hour (default: {DEFAULT_START_HOUR})")
+    parser.add_argument('--end-hour', type=int, default=DEFAULT_END_HOUR,
+                        help=f"hour by which sessions end (default: {DEFAULT_END_HOUR})")
+    parser.add_argument('--blackout', nargs=3, action='append', metavar=('DAY', 'START', 'END'),
+                        help="blocked window, e.g. --blackout Tuesday 10 12; repeatable (default: Tuesday 10-12)")
+    parser.add_argument('--day-patterns', default=None, metavar='PATH',
+                        help='JSON file of preferred day patterns, e.g. {"2": [["Sunday", "Tuesday"]]} (default: built in)')
+    parser.add_argument('--order', choices=ORDERING_METHODS, default='cliques',
+                        help="how courses are ordered for scheduling (default: cliques)")
+    parser.add_argument('--clique-mode', choices=['all', 'top-k', 'cover'], default='all',
+                        help="how cliques are found for the 'cliques' ordering (default: all)")
+    parser.add_argument('--clique-limit', type=int, default=None,
+                        help="cap on enumerated cliques, or k for --clique-mode top-k")
+    parser.add_argument('--section-clashes', action='store_true',
+                        help="split students into sections and count clashes between sections instead of courses")
+    parser.add_argument('--max-clash', type=int, default=None,
+                        help="most clashing students allowed in any hour of a placed session (default: no limit)")
+    parser.add_argument('--starts', type=int, default=1,
+                        help="number of perturbed course orderings to try in parallel, keeping the best (default: 1)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes for --starts (default: one per CPU)")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="random seed for --starts and --improve")
+    parser.add_argument('--improve', type=float, default=0.0, metavar='SECONDS',
+                        help="time budget for the local-search improvement phase (default: off)")
+    parser.add_argument('--validate', default=None, metavar='PATH',
+                        help="validate the final timetable and write the report to this JSON file")
+    parser.add_argument('--export', action='append', default=[], metavar='PATH',
+                        help="also write the timetable with day, hours and length to a .csv, .parquet or .json file; repeatable")
+    parser.add_argument('--grids', default=None, metavar='DIR',
+                        help="write per-course and per-room weekly grids as HTML to this directory")
+    parser.add_argument('--student-timetables', default=None, metavar='PATH',
+                        help="write every student's timetable: weekly grids for .html, else rows as .csv, .parquet or .json")
+    parser.add_argument('--load-report', default=None, metavar='PATH',
+                        help="write each lecturer's load and remaining MaxLoad hours to this CSV file")
+    parser.add_argument('--trace', default=None, metavar='PATH',
+                        help="record stage timings and hot-path counters and write them to this JSON file")
+    parser.add_argument('--profile-stage', action='append', default=[], metavar='STAGE',
+                        help="run a stage (e.g. schedule_sections) under cProfile and add it to --trace; repeatable")
+    return parser
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.clique_mode == 'top-k' and args.clique_limit is None:
+        parser.error("--clique-mode top-k needs --clique-limit K")
+
+    blackouts = None
+    if args.blackout:
+        blackouts = [(day, int(start), int(end)) for day, start, end in args.blackout]
+    day_patterns = None
+    if args.day_patterns:
+        with open(args.day_patterns) as f:
+            day_patterns = json.load(f)
+    calendar = SlotCalendar(args.days, args.start_hour, args.end_hour, blackouts, day_patterns)
+
+    cache = ClashCache(args.cache_dir, args.cache_size * 1024 * 1024) if args.cache_dir else None
+
+    if args.bundle:
+        problem = load_problem_bundle(args.bundle, calendar)
+        problem.cache = cache
+    else:
+        equivalences = args.equivalences
+        if equivalences is None and os.path.exists(DEFAULT_COURSE_EQUIVALENCES):
+            equivalences = DEFAULT_COURSE_EQUIVALENCES
+        problem = TimetablingProblem(args.advised, args.course_details, args.rooms, args.lecturers, calendar, cache,
+                                     args.chunksize, equivalences)
+
+    for delta_path in args.advising_delta:
+        delta = load_advising_delta(delta_path, problem.course_equivalences)
+        touched = problem.apply_delta(delta)
+        print(f"Applied {len(delta)} advising changes from {delta_path}; clash edges of {len(touched)} courses changed")
+
+    if args.compile:
+        manifest = compile_problem(problem, args.compile)
+        print(f"Compiled {manifest['courses']} courses, {manifest['students']} students and "
+              f"{manifest['clash_edges']} clash edges to {args.compile}")
+        return
+    profiler = PipelineProfiler(args.profile_stage) if (args.trace or args.profile_stage) else None
+    with profiling(profiler):
+        run_timetabling(problem, args.out, args.order, args.clique_mode, args.clique_limit, args.max_clash,
+                        args.starts, args.workers, args.seed, args.improve, args.validate, args.load_report,
+                        args.section_clashes, args.export, args.grids, args.student_timetables)
+
+    if profiler is not None:
+        trace_path = args.trace or 'timetable_trace.json'
+        profiler.write(trace_path)
+        print(f"Trace written to {trace_path}")
 
 if __name__ == "__main__":
     main()
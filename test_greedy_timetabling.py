@@ -0,0 +1,432 @@
+import json
+import os
+import pickle
+from itertools import combinations
+
+import pandas as pd
+import pytest
+
+import greedy_timetabling as gt
+from benchmark import generate_synthetic_problem
+
+
+def edge_weights(G):
+    """
+    Return {frozenset(course pair): weight} for a clash graph.
+    """
+    return {frozenset((u, v)): data['weight'] for u, v, data in G.edges(data=True)}
+
+
+def greedy_timetable(problem, G):
+    """
+    Run the greedy scheduler and the repair pass on a problem, clashes counted on G.
+    """
+    return gt.run_greedy(problem.ranked_cliques(), problem.df_course_details, problem.df_rooms, problem.df_lecturer_prefs,
+                         problem.resource_index, problem.calendar, G)
+
+
+def timetable_cost(timetable, problem, G):
+    """
+    Recompute the improve_timetable cost of a timetable from scratch.
+    """
+    unscheduled, clashes, preference_cost = gt.score_timetable(timetable, G, problem.calendar, problem.resource_index)
+    return unscheduled * gt.UNSCHEDULED_PENALTY + clashes + preference_cost
+
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+    """
+    A small synthetic problem (about 200 students and 30 courses) written to CSV files.
+    """
+    out_dir = tmp_path_factory.mktemp('problem')
+    return generate_synthetic_problem(str(out_dir), scale=0.3, seed=1)
+
+
+@pytest.fixture()
+def problem(dataset):
+    paths = dataset['paths']
+    return gt.TimetablingProblem(paths['advised_courses'], paths['course_details'], paths['rooms'], paths['lecturer_prefs'])
+
+
+def test_sparse_clash_graph_matches_pairwise_counts(problem):
+    df = problem.df_advised_courses
+    G = gt.build_clash_graph(df)
+
+    expected = {}
+    for course1, course2 in combinations(df['CourseNo'].unique(), 2):
+        count = gt.get_clash_count(course1, course2, df)
+        if count > 0:
+            expected[frozenset((course1, course2))] = count
+
+    assert expected
+    assert edge_weights(G) == expected
+
+
+def test_incremental_clash_graph_matches_full_rebuild(problem):
+    df = problem.df_advised_courses[['StudentNo', 'CourseNo']].drop_duplicates().reset_index(drop=True)
+    added = df.sample(40, random_state=0)
+    base = df.drop(added.index)
+    removed = base.sample(40, random_state=1)
+
+    incremental = gt.IncrementalClashGraph(base)
+    delta = [(student, course, 'add') for student, course in added.itertuples(index=False)]
+    delta += [(student, course, 'remove') for student, course in removed.itertuples(index=False)]
+    touched = incremental.apply_delta(delta)
+
+    rebuilt = gt.build_clash_graph(pd.concat([base, added]).drop(removed.index))
+    assert touched
+    assert set(incremental.graph.nodes) == set(rebuilt.nodes)
+    assert edge_weights(incremental.graph) == edge_weights(rebuilt)
+    assert {frozenset(clique) for clique in incremental.cliques} == {frozenset(clique) for clique in gt.nx.find_cliques(rebuilt)}
+
+
+@pytest.mark.parametrize('section_clashes', [False, True])
+def test_annealing_tracked_cost_matches_recomputed_cost(problem, section_clashes):
+    G = problem.section_clash_graph if section_clashes else problem.clash_graph
+    timetable = greedy_timetable(problem, G)
+    initial_cost = timetable_cost(timetable, problem, G)
+
+    timetable, stats = gt.improve_timetable(timetable, G, problem.df_course_details, problem.df_rooms, problem.df_lecturer_prefs,
+                                            problem.resource_index, problem.calendar, time_budget=60, max_iterations=3000, seed=3)
+
+    assert stats['initial_cost'] == initial_cost
+    assert stats['accepted'] > 0
+    assert stats['final_cost'] == timetable_cost(timetable, problem, G)
+
+
+def test_problem_bundle_round_trip(dataset, tmp_path):
+    paths = dataset['paths']
+    equivalences_path = tmp_path / 'equivalences.csv'
+    pd.DataFrame({'CourseNo': ['SYN00001', 'SYN00002'], 'EquivalentCourseNo': ['SYN00003', 'SYN00001']}) \
+        .to_csv(equivalences_path, index=False)
+    problem = gt.TimetablingProblem(paths['advised_courses'], paths['course_details'], paths['rooms'], paths['lecturer_prefs'],
+                                    equivalences=str(equivalences_path))
+
+    bundle_dir = tmp_path / 'bundle'
+    gt.compile_problem(problem, str(bundle_dir))
+    # The bundle must not need the equivalences file it was compiled from
+    equivalences_path.unlink()
+    loaded = gt.load_problem_bundle(str(bundle_dir))
+
+    for attribute in gt.BUNDLE_TABLES:
+        pd.testing.assert_frame_equal(getattr(loaded, attribute), getattr(problem, attribute), check_dtype=False)
+    assert loaded.course_equivalences.mapping() == problem.course_equivalences.mapping()
+    assert 'SYN00001/SYN00003/SYN00002' in set(loaded.df_advised_courses['CourseNo'])
+    assert edge_weights(loaded.clash_graph) == edge_weights(problem.clash_graph)
+    assert loaded.advising_key == problem.advising_key
+
+
+@pytest.mark.parametrize('pairs', [[], [('SYN00001', 'SYN00003'), ('SYN00002', 'SYN00001')]])
+def test_chunked_clash_graph_matches_in_memory(dataset, tmp_path, monkeypatch, pairs):
+    paths = dataset['paths']
+    equivalences = None
+    if pairs:
+        equivalences = str(tmp_path / 'equivalences.csv')
+        pd.DataFrame(pairs, columns=['CourseNo', 'EquivalentCourseNo']).to_csv(equivalences, index=False)
+
+    def load(chunksize):
+        return gt.TimetablingProblem(paths['advised_courses'], paths['course_details'], paths['rooms'], paths['lecturer_prefs'],
+                                     chunksize=chunksize, equivalences=equivalences)
+
+    in_memory, chunked = load(None), load(97)
+    incidence, courses = gt.build_incidence_matrix(in_memory.df_advised_courses)
+    chunked_incidence, chunked_courses, _ = gt.build_incidence_matrix_from_csv(paths['advised_courses'], 97,
+                                                                             chunked.course_equivalences)
+
+    assert list(chunked_courses) == list(courses)
+    assert (chunked_incidence != incidence).nnz == 0
+    # Folding the pending chunks into the matrix several times gives the same matrix
+    monkeypatch.setattr(gt, 'INCIDENCE_FOLD_MIN', 50)
+    folded_incidence, _, _ = gt.build_incidence_matrix_from_csv(paths['advised_courses'], 97, chunked.course_equivalences)
+    assert (folded_incidence != incidence).nnz == 0
+    assert edge_weights(chunked.clash_graph) == edge_weights(in_memory.clash_graph)
+    assert 'df_advised_courses' not in chunked.__dict__
+    assert chunked.advising_key == in_memory.advising_key
+
+
+@pytest.mark.parametrize('section_clashes', [False, True])
+def test_validator_clash_total_matches_count_student_clashes(problem, section_clashes):
+    G = problem.section_clash_graph if section_clashes else problem.clash_graph
+    timetable = greedy_timetable(problem, G)
+    validator = gt.TimetableValidator(problem.df_course_details, problem.df_rooms, G, problem.calendar)
+
+    expected = gt.count_student_clashes(timetable, G, problem.calendar)
+    fast = validator.validate(timetable, clash_pairs=False)
+    report = validator.validate(timetable)
+
+    assert expected > 0
+    assert fast['student_clash_total'] == expected
+    assert report['student_clash_total'] == expected
+    assert report['student_clashes']['Students'].sum() == expected
+    assert not report['room_double_bookings'] and not report['lecturer_double_bookings']
+
+
+def test_repair_ejects_a_smaller_course_and_replaces_it():
+    # One slot per day. BIG's only lecturer is busy on Monday and its only room is taken by
+    # SMALL on Sunday, so BIG can only be placed by moving SMALL to Monday.
+    calendar = gt.SlotCalendar(['Sunday', 'Monday'], start_hour=8, end_hour=9, blackouts=[])
+    df_course_details = pd.DataFrame({
+        'CourseNo': ['BIG', 'SMALL', 'OTHER'], 'CourseName': ['Big', 'Small', 'Other'],
+        'NumberOfAdvisedStudents': [100, 10, 20], 'NumberOfSections': 1, 'AverageStudentsPerSection': [100, 10, 20],
+        'ContactHours': 1, 'NumberofSessions': 1, 'RoomType': ['Lecture', 'Lecture', 'Lab'],
+    })
+    df_rooms = pd.DataFrame({'RoomNo': ['R1', 'R2'], 'Type': ['Lecture', 'Lab'], 'Capacity': [120, 30]})
+    df_lecturer_prefs = pd.DataFrame({
+        'Sno': [1, 2], 'FacultyID': ['L1', 'L2'], 'FacultyName': ['One', 'Two'], 'MaxLoad': 12,
+        'Pref1': ['BIG', 'SMALL'], 'Pref2': ['OTHER', None], 'Pref3': None, 'Pref4': None, 'Pref5': None,
+    })
+    sunday, monday = calendar.slot_index['Sunday 08:00'], calendar.slot_index['Monday 08:00']
+
+    assignments = gt.AssignmentTable(calendar)
+    assignments.add_session('SMALL', 0, sunday, 'R1', 'L2', 1)
+    assignments.add_session('OTHER', 0, monday, 'R2', 'L1', 1)
+    big = assignments.add_session('BIG', 0, None, None, None, 1)
+
+    room_availability, lecturer_availability = gt.build_availability_from_timetable(assignments, df_rooms, df_lecturer_prefs, calendar)
+    resource_index = gt.build_resource_index(df_rooms, df_lecturer_prefs)
+    stats = gt.repair_unscheduled_sessions(assignments, df_course_details, room_availability, lecturer_availability,
+                                           resource_index, calendar)
+
+    assert stats == {'queued': 1, 'any-day': 0, 'adjacent': 0, 'ejection': 1, 'overload': 0, 'unscheduled': 0}
+    assert assignments.session(big)['time_slot'] == 'Sunday 08:00'
+    small = assignments.rows_for_section('SMALL', 0)[0]
+    assert (assignments.slot_of(small), assignments.room_of(small)) == (monday, 'R1')
+
+    # The availability tables were updated in step with the moves
+    rebuilt_rooms, rebuilt_lecturers = gt.build_availability_from_timetable(assignments, df_rooms, df_lecturer_prefs, calendar)
+    assert room_availability.masks == rebuilt_rooms.masks
+    assert lecturer_availability.masks == rebuilt_lecturers.masks
+    assert lecturer_availability.load == rebuilt_lecturers.load
+    report = gt.TimetableValidator(df_course_details, df_rooms, calendar=calendar).validate(assignments)
+    assert report['valid']
+
+
+def test_course_equivalences_merge_chains_in_first_seen_order():
+    equivalences = gt.CourseEquivalences([('A', 'B'), ('C', 'D'), ('D', 'B'), ('E', 'E')])
+
+    assert equivalences.mapping() == {code: 'A/B/C/D' for code in 'ABCD'}
+    assert equivalences.find('D') == 'A'
+    assert equivalences.find('X') == 'X'
+    assert gt.CourseEquivalences([('D', 'B'), ('A', 'B'), ('C', 'D')]).mapping()['A'] == 'D/B/A/C'
+
+    df = pd.DataFrame({'StudentNo': ['s1', 's1', 's2', 's2'], 'CourseNo': ['A', 'C', 'B', 'X']})
+    merged = gt.merge_equivalent_courses(df, equivalences)
+    assert merged['CourseNo'].tolist() == ['A/B/C/D', 'A/B/C/D', 'A/B/C/D', 'X']
+    assert gt.merge_equivalent_courses(df, None) is df
+
+
+def test_exports_round_trip_and_cover_every_session(problem, tmp_path):
+    timetable = greedy_timetable(problem, problem.clash_graph)
+    df_sessions = gt.session_frame(timetable, problem.calendar)
+    assert len(df_sessions) == len(timetable)
+
+    readers = {'.csv': pd.read_csv, '.parquet': pd.read_parquet, '.json': pd.read_json}
+    for extension, read in readers.items():
+        path = str(tmp_path / f"timetable{extension}")
+        gt.export_timetable(timetable, path, problem.calendar)
+        pd.testing.assert_frame_equal(read(path), df_sessions, check_dtype=False)
+    with pytest.raises(ValueError):
+        gt.export_timetable(timetable, str(tmp_path / 'timetable.xlsx'), problem.calendar)
+
+    # Every hour of every placed session shows up once in the course grids
+    placed = df_sessions[df_sessions['TimeSlot'].notna()]
+    grids = gt.course_grids(timetable, problem.df_course_details, problem.calendar)
+    labels = sum(cell.count('Sec ') for grid in grids.values() for cell in grid.to_numpy().ravel())
+    assert labels == placed['Length'].sum()
+
+    # Each student gets the sessions of exactly the sections they were put in
+    df_sections = problem.student_sections
+    df_students = gt.student_timetables(timetable, df_sections, problem.calendar)
+    sessions_per_section = df_sessions.groupby(['Course', 'Section']).size().rename('Sessions').reset_index()
+    expected = df_sections.rename(columns={'CourseNo': 'Course'}).merge(sessions_per_section, on=['Course', 'Section'])
+    assert len(df_students) == expected['Sessions'].sum()
+    n_students = gt.export_student_timetables(timetable, df_sections, str(tmp_path / 'students.html'), problem.calendar)
+    assert n_students == df_sections['StudentNo'].nunique()
+
+
+def test_annealing_adds_no_room_capacity_shortfalls(problem):
+    G = problem.clash_graph
+    timetable = greedy_timetable(problem, G)
+    validator = gt.TimetableValidator(problem.df_course_details, problem.df_rooms, G, problem.calendar)
+
+    def shortfalls(report):
+        return {(item['course'], item['section'], item['session']) for item in report['room_capacity_shortfalls']}
+
+    before = validator.validate(timetable, clash_pairs=False)
+    unscheduled = {(row['Course'], row['Section'], row['Session']) for row in
+                   gt.session_frame(timetable, problem.calendar).query('TimeSlot.isna()').to_dict('records')}
+    timetable, stats = gt.improve_timetable(timetable, G, problem.df_course_details, problem.df_rooms, problem.df_lecturer_prefs,
+                                            calendar=problem.calendar, time_budget=60, max_iterations=5000, seed=5)
+    after = validator.validate(timetable, clash_pairs=False)
+
+    assert stats['accepted'] > 0
+    assert shortfalls(after) <= shortfalls(before) | unscheduled
+
+
+def test_best_fit_room_prefers_smallest_adequate_room():
+    df_rooms = pd.DataFrame({'RoomNo': ['L60', 'L20', 'L40', 'L30', 'B40'],
+                             'Type': ['Lecture', 'Lecture', 'Lecture', 'Lecture', 'Lab'],
+                             'Capacity': [60, 20, 40, 30, 40]})
+    df_lecturer_prefs = pd.DataFrame({'FacultyID': ['L1'], 'Pref1': ['C1'], 'Pref2': None, 'Pref3': None, 'Pref4': None, 'Pref5': None})
+    resource_index = gt.build_resource_index(df_rooms, df_lecturer_prefs)
+
+    # Rooms that fit come smallest first, then the too-small ones largest first
+    assert list(gt.best_fit_order(resource_index, 'Lecture', 35)) == ['L40', 'L60', 'L30', 'L20']
+    assert list(gt.best_fit_order(resource_index, 'Lecture', 40)) == ['L40', 'L60', 'L30', 'L20']
+    assert list(gt.best_fit_order(resource_index, 'Lecture', 100)) == ['L60', 'L40', 'L30', 'L20']
+
+    room_availability = gt.AvailabilityTable(df_rooms['RoomNo'], ['Sunday 08:00', 'Sunday 09:00'])
+    assert gt.best_fit_room(room_availability, resource_index, 'Lecture', 35, 0) == 'L40'
+    room_availability.book('L40', 0)
+    assert gt.best_fit_room(room_availability, resource_index, 'Lecture', 35, 0) == 'L60'
+    # A smaller room only when no room that seats the section is free
+    room_availability.book('L60', 0)
+    assert gt.best_fit_room(room_availability, resource_index, 'Lecture', 35, 0) == 'L30'
+    assert gt.best_fit_room(room_availability, resource_index, 'Lecture', 35, 1) == 'L40'
+    assert gt.best_fit_room(room_availability, resource_index, 'Lecture', 35, 0, length=2) == 'L30'
+
+
+def test_lecturer_choice_follows_rank_and_max_load():
+    time_slots = ['Sunday 08:00', 'Sunday 09:00', 'Sunday 10:00', 'Sunday 11:00', 'Sunday 12:00']
+    lecturer_availability = gt.LecturerAvailability(['A', 'B', 'C'], time_slots, {'A': 2, 'B': 3, 'C': 4})
+    lecturers, ranks = ['A', 'B', 'C'], [1, 2, 2]
+
+    # The lowest preference rank wins, then the most load left
+    assert lecturer_availability.choose(lecturers, 0, 1, ranks) == 'A'
+    lecturer_availability.book('A', 0)
+    assert lecturer_availability.choose(lecturers, 0, 1, ranks) == 'C'
+    # A lecturer at MaxLoad is passed over for one with load left, whatever the rank
+    lecturer_availability.book('A', 1)
+    assert lecturer_availability.choose(lecturers, 2, 1, ranks) == 'C'
+    assert lecturer_availability.choose(lecturers, 3, 2, ranks) == 'C'
+
+    # B has load left but is busy at 0: no one is overloaded unless asked for
+    lecturer_availability = gt.LecturerAvailability(['A', 'B'], time_slots, {'A': 1, 'B': 3})
+    lecturer_availability.book('A', 1)
+    lecturer_availability.book('B', 0)
+    assert lecturer_availability.choose(['A', 'B'], 0, 1, [2, 1]) is None
+    assert lecturer_availability.choose(['A', 'B'], 0, 1, [2, 1], overload=True) == 'A'
+    # Once every lecturer is at MaxLoad the free one least over it takes the session, then by rank
+    lecturer_availability.book('B', 2, 2)
+    assert lecturer_availability.choose(['A', 'B'], 0, 1, [2, 1]) == 'A'
+    assert lecturer_availability.choose(['A', 'B'], 4, 1, [2, 1]) == 'B'
+    lecturer_availability.book('B', 1)
+    assert lecturer_availability.choose(['A', 'B'], 4, 1, [2, 1]) == 'A'
+
+
+def test_problem_apply_delta_matches_a_fresh_problem(dataset, tmp_path):
+    paths = dataset['paths']
+    problem = gt.TimetablingProblem(paths['advised_courses'], paths['course_details'], paths['rooms'], paths['lecturer_prefs'])
+    df = problem.df_advised_courses
+    problem.ranked_cliques()
+
+    removed = df.sample(30, random_state=2)
+    students = df['StudentNo'].unique()[:20]
+    added = pd.DataFrame({'StudentNo': students, 'CourseNo': 'SYN00000'})
+    delta_path = tmp_path / 'delta.csv'
+    pd.concat([removed[['StudentNo', 'CourseNo']].assign(Action='remove'), added.assign(Action='add')]).to_csv(delta_path, index=False)
+    touched = problem.apply_delta(gt.load_advising_delta(str(delta_path)))
+
+    records = df[['StudentNo', 'CourseNo']].drop(removed.index)
+    existing = set(zip(records['StudentNo'], records['CourseNo']))
+    records = pd.concat([records, added[[pair not in existing for pair in zip(added['StudentNo'], added['CourseNo'])]]])
+    records_path = tmp_path / 'advised.csv'
+    records.to_csv(records_path, index=False)
+    fresh = gt.TimetablingProblem(str(records_path), paths['course_details'], paths['rooms'], paths['lecturer_prefs'])
+
+    assert touched
+    pd.testing.assert_frame_equal(problem.df_advised_courses[['StudentNo', 'CourseNo']], fresh.df_advised_courses)
+    assert problem.advising_key == fresh.advising_key
+    assert edge_weights(problem.clash_graph) == edge_weights(fresh.clash_graph)
+    assert sorted(map(sorted, problem.ranked_cliques())) == sorted(map(sorted, fresh.ranked_cliques()))
+    pd.testing.assert_frame_equal(problem.student_sections, fresh.student_sections, check_dtype=False)
+
+
+def test_max_clash_limits_students_per_hour_not_student_hours():
+    G = gt.nx.Graph()
+    G.add_edge('A', 'B', weight=3)
+    G.add_edge('A', 'C', weight=4)
+    occupancy = gt.ClashOccupancy(G, 4, max_clash_weight=5)
+    occupancy.add('B', 0, 2)
+    occupancy.add('C', 1)
+
+    # A two-hour session of A over slots 0-1 clashes with 3 students, then 7
+    assert occupancy.weight('A', 0, 2) == 10
+    assert occupancy.students('A', 0, 2) == 7
+    assert not occupancy.allows('A', 0, 2)
+    # Over slots 2-3 nothing clashes; at slot 0 alone 3 students do
+    assert occupancy.allows('A', 2, 2)
+    assert occupancy.weight('A', 0) == occupancy.students('A', 0) == 3
+    occupancy.remove('C', 1)
+    assert occupancy.weight('A', 0, 2) == 6
+    assert occupancy.allows('A', 0, 2)
+
+
+def test_calendar_day_patterns_and_blackout_starts():
+    # Patterns as read from a --day-patterns JSON file, with string keys and lists
+    day_patterns = json.loads('{"2": [["Tuesday", "Monday"]], "1": [["Monday"]]}')
+    calendar = gt.SlotCalendar(['Monday', 'Tuesday'], start_hour=8, end_hour=13, blackouts=[('Tuesday', 10, 12)],
+                               day_patterns=day_patterns)
+    assert calendar.day_patterns(2) == [('Tuesday', 'Monday')]
+    assert calendar.day_patterns(1) == [('Monday',)]
+
+    with pytest.raises(ValueError, match='has 1 days'):
+        gt.SlotCalendar(['Monday', 'Tuesday'], day_patterns={'2': [['Monday']]})
+    with pytest.raises(ValueError, match="'Sunday'"):
+        gt.SlotCalendar(['Monday', 'Tuesday'], day_patterns={'2': [['Sunday', 'Monday']]})
+    # Default patterns using other days are dropped, falling back to every choice of distinct days
+    assert gt.SlotCalendar(['Sunday', 'Monday']).day_patterns(2) == [('Sunday', 'Monday')]
+
+    # 11:00 falls inside the Tuesday blackout and 10:00 overlaps it, so a two-hour session
+    # can only start at 08:00; sessions must also end by 13:00
+    def starts(length, day=None):
+        return [calendar.time_slots[i] for i in calendar.valid_starts(length, day)]
+
+    assert 'Tuesday 11:00' not in calendar.slot_index
+    assert starts(1, 'Tuesday') == ['Tuesday 08:00', 'Tuesday 09:00', 'Tuesday 12:00']
+    assert starts(2, 'Tuesday') == ['Tuesday 08:00']
+    assert starts(2) == ['Monday 08:00', 'Monday 09:00', 'Monday 10:00', 'Monday 11:00', 'Tuesday 08:00']
+    assert not calendar.is_valid_start(calendar.slot_index['Tuesday 09:00'], 2)
+    assert calendar.valid_start_mask(2, 'Tuesday') == 1 << calendar.slot_index['Tuesday 08:00']
+
+
+def test_clash_cache_evicts_least_recently_used(tmp_path):
+    value = b'x' * 1000
+    size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = gt.ClashCache(str(tmp_path), max_bytes=3 * size)
+    for age, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, value)
+        os.utime(tmp_path / f'{key}.pkl', (1000 + age, 1000 + age))
+
+    # Reading 'a' makes it the most recently used, so 'b' and then 'c' go first
+    assert cache.get('a') == value
+    cache.put('d', value)
+    assert sorted(path.stem for path in tmp_path.glob('*.pkl')) == ['a', 'c', 'd']
+    assert cache.get('b') is None
+    cache.put('e', value)
+    assert sorted(path.stem for path in tmp_path.glob('*.pkl')) == ['a', 'd', 'e']
+
+
+def test_clash_cache_is_reused_until_the_advising_data_changes(dataset, tmp_path, monkeypatch):
+    paths = dataset['paths']
+    cache = gt.ClashCache(str(tmp_path / 'cache'))
+
+    def make_problem(advised_courses):
+        return gt.TimetablingProblem(advised_courses, paths['course_details'], paths['rooms'], paths['lecturer_prefs'],
+                                     cache=cache)
+
+    G = make_problem(paths['advised_courses']).clash_graph
+    built = gt.build_clash_graph
+    monkeypatch.setattr(gt, 'build_clash_graph', lambda df: pytest.fail('clash graph rebuilt on a cache hit'))
+    assert edge_weights(make_problem(paths['advised_courses']).clash_graph) == edge_weights(G)
+
+    # Dropping a student changes the advising key, so the graph is built again and cached beside the old one
+    df = pd.read_csv(paths['advised_courses'])
+    changed_path = tmp_path / 'advised_courses.csv'
+    df[df['StudentNo'] != df['StudentNo'].iloc[0]].to_csv(changed_path, index=False)
+    monkeypatch.setattr(gt, 'build_clash_graph', built)
+    changed = make_problem(str(changed_path))
+    assert changed.advising_key != make_problem(paths['advised_courses']).advising_key
+    assert edge_weights(changed.clash_graph) == edge_weights(gt.build_clash_graph(changed.df_advised_courses))
+    assert edge_weights(changed.clash_graph) != edge_weights(G)
+    assert len(list((tmp_path / 'cache').glob('graph-*.pkl'))) == 2